@@ -1,9 +1,10 @@
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
+from app.log import configure_logging
 import os
 
-def create_app():
+def create_app(resume_jobs=True):
     app = Flask(__name__)
     
     CORS(app, 
@@ -20,6 +21,65 @@ def create_app():
     app.config['SPOTIFY_CLIENT_ID'] = os.getenv('SPOTIFY_CLIENT_ID')
     app.config['SPOTIFY_CLIENT_SECRET'] = os.getenv('SPOTIFY_CLIENT_SECRET')
     app.config['SPOTIFY_REDIRECT_URI'] = os.getenv('SPOTIFY_REDIRECT_URI', 'http://localhost:5000/callback')
+    app.config['SPOTIFY_PAGE_WORKERS'] = int(os.getenv('SPOTIFY_PAGE_WORKERS', 4))
+    app.config['SPOTIFY_POOL_SIZE'] = int(os.getenv('SPOTIFY_POOL_SIZE', 20))
+    
+    # Shared public playlist cache: metadata is revalidated after PLAYLIST_CACHE_FRESH seconds
+    app.config['PLAYLIST_CACHE_FRESH'] = int(os.getenv('PLAYLIST_CACHE_FRESH', 300))
+    app.config['PLAYLIST_CACHE_MAX_BYTES'] = int(os.getenv('PLAYLIST_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    
+    # Track match cache settings
+    app.config['MATCH_CACHE_PATH'] = os.getenv('MATCH_CACHE_PATH', os.path.join(os.path.dirname(app.root_path), 'match_cache.db'))
+    app.config['MATCH_CACHE_TTL'] = int(os.getenv('MATCH_CACHE_TTL', 30 * 24 * 3600))
+    app.config['MATCH_CACHE_MAX_SIZE'] = int(os.getenv('MATCH_CACHE_MAX_SIZE', 50000))
+    app.config['MATCH_CACHE_NEGATIVE_TTL'] = int(os.getenv('MATCH_CACHE_NEGATIVE_TTL', 3 * 24 * 3600))
+    
+    # Ranked track matching settings
+    app.config['MATCH_CANDIDATES'] = int(os.getenv('MATCH_CANDIDATES', 5))
+    app.config['MATCH_CONFIDENCE_THRESHOLD'] = float(os.getenv('MATCH_CONFIDENCE_THRESHOLD', 0.6))
+    app.config['MATCH_MIN_CONFIDENCE'] = float(os.getenv('MATCH_MIN_CONFIDENCE', 0.35))
+    
+    # YouTube Music accounts: every *.json auth file in YTM_AUTH_DIR, or the single YTM_AUTH_FILE
+    app.config['YTM_AUTH_DIR'] = os.getenv('YTM_AUTH_DIR', '')
+    app.config['YTM_AUTH_FILE'] = os.getenv('YTM_AUTH_FILE', os.path.join(os.path.dirname(app.root_path), 'browser.json'))
+    app.config['YTM_CLIENT_COOLDOWN'] = float(os.getenv('YTM_CLIENT_COOLDOWN', 60))
+    
+    # Connect to YouTube Music in the background at startup instead of on first use
+    app.config['YTM_WARMUP'] = os.getenv('YTM_WARMUP', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Batched playlist insertion settings
+    app.config['YTM_WRITE_CHUNK_SIZE'] = int(os.getenv('YTM_WRITE_CHUNK_SIZE', 50))
+    app.config['YTM_WRITE_FLUSH_INTERVAL'] = float(os.getenv('YTM_WRITE_FLUSH_INTERVAL', 5.0))
+    
+    # Conversion engine, job store and per-account search rate limiting settings
+    app.config['JOB_STORE_PATH'] = os.getenv('JOB_STORE_PATH', os.path.join(os.path.dirname(app.root_path), 'jobs.db'))
+    app.config['JOB_LEASE'] = float(os.getenv('JOB_LEASE', 60))
+    app.config['JOB_RESUME'] = resume_jobs
+    app.config['CONVERSION_MAX_JOBS'] = int(os.getenv('CONVERSION_MAX_JOBS', 4))
+    app.config['CONVERSION_SEARCH_WORKERS'] = int(os.getenv('CONVERSION_SEARCH_WORKERS', 8))
+    app.config['CONVERSION_CONCURRENCY'] = int(os.getenv('CONVERSION_CONCURRENCY', 4))
+    app.config['PREVIEW_CANDIDATES'] = int(os.getenv('PREVIEW_CANDIDATES', 3))
+    app.config['YTM_SEARCH_RATE'] = float(os.getenv('YTM_SEARCH_RATE', 5.0))
+    app.config['YTM_SEARCH_BURST'] = int(os.getenv('YTM_SEARCH_BURST', 10))
+    
+    # Retry and circuit breaker settings for Spotify and YouTube Music calls
+    app.config['RETRY_ATTEMPTS'] = int(os.getenv('RETRY_ATTEMPTS', 3))
+    app.config['RETRY_BASE_DELAY'] = float(os.getenv('RETRY_BASE_DELAY', 0.5))
+    app.config['RETRY_MAX_DELAY'] = float(os.getenv('RETRY_MAX_DELAY', 30.0))
+    app.config['CIRCUIT_FAILURE_THRESHOLD'] = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+    app.config['CIRCUIT_RESET_TIMEOUT'] = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30.0))
+    
+    # Progress streaming settings
+    app.config['PROGRESS_HEARTBEAT'] = float(os.getenv('PROGRESS_HEARTBEAT', 15))
+    app.config['PROGRESS_RETENTION'] = int(os.getenv('PROGRESS_RETENTION', 600))
+    
+    # Worker threads for non-streaming requests under the ASGI server (app/asgi.py)
+    app.config['ASGI_WORKERS'] = int(os.getenv('ASGI_WORKERS', 32))
+    
+    # Logging settings (LOG_FORMAT is 'json' or 'text')
+    app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO')
+    app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json')
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
     
     # Register blueprints
     from app.routes import bp as main_bp
@@ -0,0 +1,170 @@
+"""
+ASGI front for the Flask app. Progress streams (/convert-progress/<id>) are
+served on the event loop, so an open stream holds no thread; every other
+request runs the Flask app on a bounded pool of worker threads, where the
+blocking Spotify and YouTube Music calls happen.
+
+Run with:
+    uvicorn --factory app.asgi:create_asgi_app --port 5000
+or `python run.py --async`.
+"""
+import asyncio
+import io
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import routes
+
+PROGRESS_PATH = re.compile(r'/convert-progress/([^/]+)')
+
+
+class AsgiApp:
+    """Serves progress streams natively and hands every other request to Flask"""
+
+    def __init__(self, flask_app, max_workers=32):
+        self.flask_app = flask_app
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            match = PROGRESS_PATH.fullmatch(scope['path'])
+            if match and scope['method'] == 'GET':
+                await self._progress_stream(match.group(1), scope, receive, send)
+            else:
+                await self._call_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _progress_stream(self, playlist_id, scope, receive, send):
+        """The /convert-progress route, awaiting the broker instead of blocking on it"""
+        headers = dict(self._headers(scope))
+        try:
+            event_id = int(headers.get('last-event-id'))
+        except (TypeError, ValueError):
+            event_id = None
+
+        broker = routes.conversion_engine.progress_broker
+        heartbeat = self.flask_app.config['PROGRESS_HEARTBEAT']
+        response_headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+        response_headers += [(name.lower().encode(), value.encode()) for name, value in routes.SSE_HEADERS.items()]
+        if 'origin' in headers:
+            response_headers.append((b'access-control-allow-credentials', b'true'))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+
+        async def stream():
+            nonlocal event_id
+            deadline = time.monotonic() + routes.STREAM_DURATION
+            while time.monotonic() < deadline:
+                event = await broker.wait_async(playlist_id, event_id, timeout=heartbeat)
+                if event is None:
+                    await send({'type': 'http.response.body', 'body': b': heartbeat\n\n', 'more_body': True})
+                    continue
+                event_id, current = event
+                message, completed = routes.progress_event(event_id, current)
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+                if completed:
+                    break
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # Stop streaming as soon as the client goes away
+        tasks = [asyncio.ensure_future(stream()), asyncio.ensure_future(disconnected())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()
+
+    async def _call_wsgi(self, scope, receive, send):
+        """Run the Flask app for one request on the worker pool"""
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        environ = self._environ(scope, b''.join(body))
+        loop = asyncio.get_running_loop()
+        status, headers, chunks = await loop.run_in_executor(self.executor, self._run_wsgi, environ)
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    def _run_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+        result = self.flask_app.wsgi_app(environ, start_response)
+        try:
+            chunks = list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], chunks
+
+    @staticmethod
+    def _headers(scope):
+        for name, value in scope.get('headers', []):
+            yield name.decode('latin-1').lower(), value.decode('latin-1')
+
+    def _environ(self, scope, body):
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in self._headers(scope):
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                continue
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def create_asgi_app(flask_app=None):
+    """Wrap a Flask app (by default a new one from create_app) for an ASGI server"""
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    return AsgiApp(flask_app, max_workers=flask_app.config['ASGI_WORKERS'])
@@ -1,24 +1,38 @@
 from flask import Blueprint, request, jsonify, redirect, session, url_for, current_app
 from app.services.spotify import SpotifyService
 from app.services.youtube import YouTubeMusicService
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+from app.services.conversion import ConversionEngine
+from app.services.job_store import JobStore, JobConflictError
+from app.services import metrics
 from datetime import datetime
 from flask import Response, stream_with_context
+import logging
 import time
 import json
-from threading import Thread
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('main', __name__)
 
 spotify_service = None
 ytmusic_service = None
+conversion_engine = None
 
 @bp.record
 def on_register(state):
-    global spotify_service, ytmusic_service
+    global spotify_service, ytmusic_service, conversion_engine
     spotify_service = SpotifyService(state.app)
-    ytmusic_service = YouTubeMusicService()
+    ytmusic_service = YouTubeMusicService(state.app)
+    job_store = JobStore.from_config(state.app.config)
+    conversion_engine = ConversionEngine.from_config(ytmusic_service, job_store, spotify_service, state.app.config)
+    
+    # Optionally connect to YouTube Music in the background
+    if state.app.config['YTM_WARMUP']:
+        ytmusic_service.warm_up()
+    
+    # Pick up jobs interrupted by the last shutdown, claiming each one first
+    if state.app.config['JOB_RESUME']:
+        conversion_engine.resume_jobs()
 
 @bp.route('/login')
 def login():
@@ -51,9 +65,20 @@ def get_public_playlist(playlist_id):
         playlist = spotify_service.get_public_playlist(playlist_id)
         return jsonify(playlist)
     except Exception as e:
-        print(f"Error fetching playlist {playlist_id}: {str(e)}")
+        logger.warning("Error fetching playlist %s: %s", playlist_id, e)
         return jsonify({"error": f"Could not access playlist: {str(e)}"}), 400
 
+def request_concurrency(data):
+    """The optional 'concurrency' of a request body as a positive int, or None. Raises ValueError otherwise"""
+    value = data.get('concurrency')
+    if value is None:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    if isinstance(value, str) and value.strip().isdigit() and int(value) > 0:
+        return int(value)
+    raise ValueError(f"concurrency must be a positive integer, got {value!r}")
+
 @bp.route('/convert', methods=['POST'])
 def convert_playlist():
     """Convert Spotify playlist to YouTube Music"""
@@ -61,9 +86,10 @@ def convert_playlist():
         data = request.get_json()
         playlist_id = data.get('playlist_id')
         use_auth = data.get('use_auth', 'token_info' in session)
+        concurrency = request_concurrency(data)
         
-        # Get tracks from Spotify
-        tracks = spotify_service.get_playlist_tracks(playlist_id, use_auth)
+        # Pick the Spotify client while the session is available
+        sp = spotify_service.get_tracks_client(use_auth)
         
         # Create playlist on YouTube Music
         ytm_playlist_id = ytmusic_service.create_playlist(
@@ -71,23 +97,204 @@ def convert_playlist():
             description=data.get('description', 'Converted from Spotify')
         )
         
-        # Start tracks addition in a background thread
-        thread = Thread(
-            target=ytmusic_service.add_tracks_to_playlist, 
-            args=(ytm_playlist_id, tracks)
+        # Stream Spotify pages through the conversion engine
+        track_pages = spotify_service.iter_playlist_track_pages(sp, playlist_id)
+        job_id = conversion_engine.submit(
+            ytm_playlist_id,
+            track_pages,
+            spotify_playlist_id=playlist_id,
+            concurrency=concurrency
         )
-        thread.daemon = True
-        thread.start()
         
-        # Return immediately with playlist ID
+        # Return immediately with playlist and job IDs
         return jsonify({
             'status': 'processing',
             'message': 'Conversion started. Check progress for updates.',
-            'spotify_tracks': len(tracks),
-            'youtube_playlist_id': ytm_playlist_id
+            'youtube_playlist_id': ytm_playlist_id,
+            'job_id': job_id
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+@bp.route('/preview', methods=['POST'])
+def preview_playlist():
+    """Resolve a Spotify playlist's matches without creating or writing a playlist"""
+    try:
+        data = request.get_json()
+        playlist_id = data.get('playlist_id')
+        use_auth = data.get('use_auth', 'token_info' in session)
+        concurrency = request_concurrency(data)
+        
+        sp = spotify_service.get_tracks_client(use_auth)
+        track_pages = spotify_service.iter_playlist_track_pages(sp, playlist_id)
+        preview_token, progress_id = conversion_engine.submit_preview(
+            track_pages,
+            spotify_playlist_id=playlist_id,
+            concurrency=concurrency
+        )
+        
+        # Progress streams under progress_id, the report is at /preview/<token>
+        return jsonify({
+            'status': 'processing',
+            'message': 'Preview started. Check progress for updates.',
+            'preview_token': preview_token,
+            'progress_id': progress_id
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/preview/<preview_token>')
+def get_preview(preview_token):
+    """Get a preview's match report: every track with its match, confidence and top candidates"""
+    job = conversion_engine.job_store.get_job(preview_token)
+    if not job or not job['options'].get('preview'):
+        return jsonify({'error': f'Preview {preview_token} not found'}), 404
+    return jsonify({
+        'preview_token': preview_token,
+        'status': job['status'],
+        'committed': job['mode'] != 'preview',
+        'spotify_playlist_id': job['spotify_playlist_id'],
+        'tracks': conversion_engine.job_store.track_counts(preview_token),
+        'average_confidence': conversion_engine.job_store.average_confidence(preview_token),
+        'results': conversion_engine.job_store.track_results(preview_token)
+    })
+
+@bp.route('/preview/<preview_token>/commit', methods=['POST'])
+def commit_preview(preview_token):
+    """Create a YouTube Music playlist and add a finished preview's matches to it without searching again"""
+    try:
+        job = conversion_engine.job_store.get_job(preview_token)
+        if not job:
+            return jsonify({'error': f'Preview {preview_token} not found'}), 404
+        if job['mode'] != 'preview' or job['status'] != 'completed':
+            return jsonify({'error': f"Preview {preview_token} is {job['status']} and cannot be committed"}), 409
+        
+        data = request.get_json(silent=True) or {}
+        ytm_playlist_id = conversion_engine.commit_preview(
+            preview_token,
+            data.get('playlist_name', 'Imported from Spotify'),
+            data.get('description', 'Converted from Spotify')
+        )
+        if not ytm_playlist_id:
+            return jsonify({'error': f'Preview {preview_token} was already committed'}), 409
+        
+        return jsonify({
+            'status': 'processing',
+            'message': 'Writing previewed matches. Check progress for updates.',
+            'youtube_playlist_id': ytm_playlist_id,
+            'job_id': preview_token
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/convert-batch', methods=['POST'])
+def convert_batch():
+    """Convert many Spotify playlists (or 'all' of the user's) with shared track resolution"""
+    try:
+        data = request.get_json()
+        playlist_ids = data.get('playlist_ids')
+        use_auth = data.get('use_auth', 'token_info' in session)
+        concurrency = request_concurrency(data)
+        
+        if playlist_ids == 'all':
+            playlists = spotify_service.get_playlists()
+        elif isinstance(playlist_ids, list) and playlist_ids:
+            playlists = [{'id': playlist_id} for playlist_id in playlist_ids]
+        else:
+            return jsonify({'error': "playlist_ids must be a list of IDs or 'all'"}), 400
+        
+        sp = spotify_service.get_tracks_client(use_auth)
+        batch_id = conversion_engine.submit_batch(
+            sp,
+            playlists,
+            concurrency=concurrency,
+            description=data.get('description', 'Converted from Spotify')
+        )
+        
+        return jsonify({
+            'status': 'processing',
+            'message': f'Batch conversion of {len(playlists)} playlists started.',
+            'batch_id': batch_id,
+            'playlists': len(playlists)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/convert-batch/<batch_id>')
+def get_batch(batch_id):
+    """Get aggregate and per-playlist progress of a batch conversion"""
+    progress = conversion_engine.progress_broker.get(batch_id)
+    if not progress:
+        return jsonify({'error': f'Batch {batch_id} not found'}), 404
+    return jsonify(progress)
+
+@bp.route('/sync', methods=['POST'])
+def sync_playlist():
+    """Bring an existing YouTube Music playlist in line with a Spotify playlist"""
+    try:
+        data = request.get_json()
+        playlist_id = data.get('playlist_id')
+        ytm_playlist_id = data.get('youtube_playlist_id')
+        if not playlist_id or not ytm_playlist_id:
+            return jsonify({'error': 'playlist_id and youtube_playlist_id are required'}), 400
+        use_auth = data.get('use_auth', 'token_info' in session)
+        concurrency = request_concurrency(data)
+        
+        # Skip all work when Spotify reports the same snapshot as the last sync
+        sp = spotify_service.get_tracks_client(use_auth)
+        snapshot_id = spotify_service.get_snapshot_id(sp, playlist_id)
+        if not data.get('force') and conversion_engine.job_store.get_snapshot(playlist_id, ytm_playlist_id) == snapshot_id:
+            return jsonify({
+                'status': 'unchanged',
+                'message': 'Playlist has not changed since the last sync.',
+                'youtube_playlist_id': ytm_playlist_id,
+                'snapshot_id': snapshot_id
+            })
+        
+        track_pages = spotify_service.iter_playlist_track_pages(sp, playlist_id)
+        job_id = conversion_engine.submit(
+            ytm_playlist_id,
+            track_pages,
+            spotify_playlist_id=playlist_id,
+            concurrency=concurrency,
+            mode='sync',
+            options={
+                'snapshot_id': snapshot_id,
+                'remove_missing': bool(data.get('remove_missing', False))
+            }
+        )
+        
+        return jsonify({
+            'status': 'processing',
+            'message': 'Sync started. Check progress for updates.',
+            'youtube_playlist_id': ytm_playlist_id,
+            'job_id': job_id
         })
+    except JobConflictError as e:
+        # Another sync is still writing to this playlist
+        return jsonify({'error': str(e), 'youtube_playlist_id': e.ytm_playlist_id, 'job_id': e.job_id}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+
+@bp.route('/jobs')
+def list_jobs():
+    """List recent conversion jobs"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(conversion_engine.job_store.list_jobs(limit))
+
+@bp.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Get a conversion job with its checkpoint counts, live progress and, on request, per-track matches"""
+    job = conversion_engine.job_store.get_job(job_id)
+    if not job:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    
+    job['tracks'] = conversion_engine.job_store.track_counts(job_id)
+    job['average_confidence'] = conversion_engine.job_store.average_confidence(job_id)
+    job['progress'] = conversion_engine.conversion_progress.get(job['ytm_playlist_id'])
+    if request.args.get('results', type=int):
+        job['results'] = conversion_engine.job_store.track_results(job_id)
+    return jsonify(job)
     
 @bp.route('/diagnose')
 def diagnose():
@@ -99,11 +306,7 @@ def diagnose():
     
     # Test Spotify
     try:
-        client_credentials_manager = SpotifyClientCredentials(
-            client_id=spotify_service.client_id,
-            client_secret=spotify_service.client_secret
-        )
-        sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+        sp = spotify_service.get_spotify_client(use_auth=False)
         categories = sp.categories(country='US', limit=1)
         
         if categories and 'categories' in categories:
@@ -137,9 +340,28 @@ def diagnose():
             'status': 'error',
             'message': f'Error connecting to YouTube Music: {str(e)}'
         }
+    
+    # Lazy client health, Spotify client reuse, progress, match and playlist caches, per-account load and throttling
+    result['youtube_music_health'] = ytmusic_service.health
+    result['progress'] = conversion_engine.progress_broker.stats()
+    result['spotify_clients'] = spotify_service.client_stats()
+    result['match_cache'] = ytmusic_service.match_cache.stats()
+    result['playlist_cache'] = spotify_service.playlist_cache.stats()
+    result['resilience'] = {
+        'spotify': dict(spotify_service.resilience.stats(), page_concurrency=spotify_service.page_concurrency.stats()),
+        'youtube_music': dict(ytmusic_service.resilience.stats(),
+                              search_concurrency=ytmusic_service.search_concurrency.stats())
+    }
+    result['youtube_music_accounts'] = ytmusic_service.clients.stats()
+    result['stages'] = metrics.registry.summary()
         
     return jsonify(result)
 
+@bp.route('/metrics')
+def get_metrics():
+    """Per-stage latency histograms, error and retry counters in Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 @bp.route('/test-playlists')
 def test_playlists():
     """Test multiple known public playlist IDs"""
@@ -155,12 +377,8 @@ def test_playlists():
     
     for playlist_id in test_ids:
         try:
-            client_credentials_manager = SpotifyClientCredentials(
-                client_id=spotify_service.client_id,
-                client_secret=spotify_service.client_secret
-            )
-            sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-            playlist = sp.playlist(playlist_id, market="US")
+            sp = spotify_service.get_spotify_client(use_auth=False)
+            playlist = spotify_service.get_playlist_metadata(sp, playlist_id)
             
             results[playlist_id] = {
                 'status': 'ok',
@@ -202,40 +420,59 @@ def test_youtube():
             'message': str(e)
         }), 400
         
+# Progress streams last up to 15 minutes
+STREAM_DURATION = 900
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+    'Access-Control-Allow-Origin': 'http://localhost:3000'
+}
+
+def progress_event(event_id, current):
+    """Format a progress snapshot as an SSE message. Returns (message, completed)"""
+    data = {
+        'total': current.get('total', 0),
+        'processed': current.get('processed', 0),
+        'added': current.get('added', 0),
+        'failed': current.get('failed', 0),
+        'unmatched_cached': current.get('unmatched_cached', 0),
+        'completed': current.get('completed', False),
+        'playlist_id': current.get('ytm_playlist_id', '')
+    }
+    # Preview jobs report how many tracks they matched
+    if 'matched' in current:
+        data['matched'] = current['matched']
+    return f"id: {event_id}\ndata: {json.dumps(data)}\n\n", data['completed']
+
 @bp.route('/convert-progress/<playlist_id>')
 def get_conversion_progress(playlist_id):
-    """Stream conversion progress as Server-Sent Events"""
+    """
+    Stream conversion progress as Server-Sent Events. Under the ASGI server
+    (app/asgi.py) this path is served on the event loop instead.
+    """
+    broker = conversion_engine.progress_broker
+    heartbeat = current_app.config['PROGRESS_HEARTBEAT']
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    
     def generate():
-        progress = getattr(ytmusic_service, 'conversion_progress', {}).get(playlist_id, {})
-        last_sent = {'total': 0, 'processed': 0, 'added': 0, 'failed': 0}
+        event_id = last_event_id
         
-        # Stream updates for up to 15 minutes
-        start_time = time.time()
-        while time.time() - start_time < 900:  # 15 minutes timeout
-            current = getattr(ytmusic_service, 'conversion_progress', {}).get(playlist_id, {})
+        deadline = time.monotonic() + STREAM_DURATION
+        while time.monotonic() < deadline:
+            # Block until the conversion publishes or the heartbeat is due
+            event = broker.wait(playlist_id, event_id, timeout=heartbeat)
+            if event is None:
+                yield ": heartbeat\n\n"
+                continue
             
-            # Send update if there's a change or every 3 seconds as heartbeat
-            if (current != last_sent) or (time.time() % 3 < 0.1):
-                data = {
-                    'total': current.get('total', 0),
-                    'processed': current.get('processed', 0),
-                    'added': current.get('added', 0),
-                    'failed': current.get('failed', 0),
-                    'completed': current.get('completed', False),
-                    'playlist_id': current.get('ytm_playlist_id', '')
-                }
-                last_sent = data.copy()
-                
-                yield f"data: {json.dumps(data)}\n\n"
-                
-                # If conversion is complete, end stream
-                if data['completed']:
-                    break
+            event_id, current = event
+            message, completed = progress_event(event_id, current)
+            yield message
             
-            time.sleep(0.5)
+            # If conversion is complete, end stream
+            if completed:
+                break
     
     return Response(stream_with_context(generate()), 
                    mimetype='text/event-stream',
-                   headers={'Cache-Control': 'no-cache',
-                           'X-Accel-Buffering': 'no',
-                           'Access-Control-Allow-Origin': 'http://localhost:3000'})
\ No newline at end of file
+                   headers=SSE_HEADERS)
\ No newline at end of file
@@ -0,0 +1,560 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from app.services import metrics
+from app.services.match_cache import MatchCache
+from app.services.playlist_writer import PlaylistWriter
+from app.services.progress import ProgressBroker
+
+logger = logging.getLogger(__name__)
+
+class BatchConversion:
+    """
+    State shared by the jobs of a multi-playlist conversion. Searches are
+    memoized by track identity so every unique track across the batch is
+    resolved exactly once, and per-playlist progress is summed into an
+    aggregate entry published under the batch ID.
+    """
+
+    def __init__(self, batch_id, progress_broker):
+        self.batch_id = batch_id
+        self.progress_broker = progress_broker
+        self.futures = {}
+        self.playlist_ids = []
+        self.submitted = False
+        self.lock = threading.Lock()
+        self.progress = progress_broker.start(batch_id, {
+            'batch_id': batch_id,
+            'total': 0,
+            'processed': 0,
+            'added': 0,
+            'failed': 0,
+            'unmatched_cached': 0,
+            'unique_tracks': 0,
+            'shared_tracks': 0,
+            'completed': False,
+            'playlists': {}
+        })
+
+    def resolve(self, pool, resolve, track):
+        """Return the Future resolving track, shared with identical tracks of the batch"""
+        keys = MatchCache.make_keys(track)
+        key = keys[-1] if keys else track.query
+        with self.lock:
+            future = self.futures.get(key)
+            if future:
+                self.progress['shared_tracks'] += 1
+                return future
+            future = self.futures[key] = pool.submit(resolve, track)
+            self.progress['unique_tracks'] += 1
+            return future
+
+    def add_playlist(self, spotify_playlist_id, ytm_playlist_id, name):
+        with self.lock:
+            self.playlist_ids.append(ytm_playlist_id)
+            self.progress['playlists'][ytm_playlist_id] = {
+                'spotify_playlist_id': spotify_playlist_id,
+                'name': name
+            }
+
+    def update(self):
+        """Recompute the aggregate from the playlists' progress and publish it"""
+        with self.lock:
+            children = [self.progress_broker.get(playlist_id) or {} for playlist_id in self.playlist_ids]
+            for field in ('total', 'processed', 'added', 'failed', 'unmatched_cached'):
+                self.progress[field] = sum(child.get(field, 0) for child in children)
+            for playlist_id, child in zip(self.playlist_ids, children):
+                self.progress['playlists'][playlist_id].update(
+                    {field: child.get(field) for field in ('job_id', 'total', 'processed', 'added', 'failed', 'completed')}
+                )
+            done = self.submitted and all(child.get('completed') for child in children)
+            if done:
+                self.progress['completed'] = True
+                self.futures.clear()
+        self.progress_broker.publish(self.batch_id)
+        return done
+
+
+class ConversionEngine:
+    """
+    Runs Spotify -> YouTube Music conversions. Jobs run on a bounded pool and
+    resolve their tracks through a shared pool of search workers, keeping at
+    most `concurrency` searches in flight per job. Results are consumed in
+    submission order so the YouTube playlist keeps the Spotify track order.
+
+    Every job is persisted in a JobStore with a per-track checkpoint, and
+    jobs left queued or running by a restart are resumed by resume_jobs().
+    Jobs are leased to the process running them: a heartbeat thread renews
+    the leases and, once resume_jobs() has been called, takes over jobs whose
+    owner stopped renewing.
+
+    Sync jobs target an existing playlist: tracks already in it are not
+    written again, items no longer on Spotify can be removed, and the
+    Spotify snapshot_id is recorded so unchanged playlists can be skipped.
+
+    Preview jobs only resolve: each track's match and best search candidates
+    are stored, and commit_preview() later writes the stored matches into a
+    new playlist without searching again.
+
+    External calls made for a job are timed per stage, and the job's stage
+    summary is stored with it and published in its final progress.
+    """
+
+    def __init__(self, ytmusic_service, job_store, spotify_service=None, progress_broker=None,
+                 max_jobs=4, max_search_workers=8, default_concurrency=4, preview_candidates=3):
+        self.ytmusic_service = ytmusic_service
+        self.spotify_service = spotify_service
+        self.job_store = job_store
+        self.max_search_workers = max_search_workers
+        self.default_concurrency = default_concurrency
+        self.preview_candidates = preview_candidates
+        self.job_pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='conversion-job')
+        self.search_pool = ThreadPoolExecutor(max_workers=max_search_workers, thread_name_prefix='ytm-search')
+
+        # Progress tracking keyed by YouTube Music playlist ID
+        self.progress_broker = progress_broker or ProgressBroker()
+        self.conversion_progress = self.progress_broker.progress
+
+        # Multi-playlist conversions in flight, keyed by batch ID
+        self.batches = {}
+
+        # Lease renewal, started with the first job
+        self.heartbeat = None
+        self.take_over = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, ytmusic_service, job_store, spotify_service, config):
+        """Build an engine from the CONVERSION_* and PROGRESS_* app settings"""
+        return cls(
+            ytmusic_service,
+            job_store,
+            spotify_service,
+            ProgressBroker(retention=config['PROGRESS_RETENTION']),
+            max_jobs=config['CONVERSION_MAX_JOBS'],
+            max_search_workers=config['CONVERSION_SEARCH_WORKERS'],
+            default_concurrency=config['CONVERSION_CONCURRENCY'],
+            preview_candidates=config['PREVIEW_CANDIDATES']
+        )
+
+    def _concurrency(self, concurrency):
+        if not concurrency:
+            return self.default_concurrency
+        return max(1, min(int(concurrency), self.max_search_workers))
+
+    def submit(self, playlist_id, track_pages, spotify_playlist_id=None, concurrency=None, mode='convert', options=None):
+        """
+        Record a job, queue it on the job pool and return its ID.
+        track_pages is an iterable of track lists, e.g. a Spotify page generator.
+        Sync jobs take 'snapshot_id' and 'remove_missing' options. Raises
+        JobConflictError while another job is writing to the same playlist.
+        """
+        job_id = self.job_store.create_job(playlist_id, spotify_playlist_id, concurrency, mode, options)
+        self._start_heartbeat()
+        self.progress_broker.start(playlist_id, self._new_progress(playlist_id, job_id))
+        self.job_pool.submit(self._run_job, job_id, track_pages)
+        return job_id
+
+    def submit_preview(self, track_pages, spotify_playlist_id=None, concurrency=None):
+        """
+        Queue a resolution-only job and return (job_id, progress_id). The job
+        ID is the preview token passed to commit_preview(), and progress is
+        published under progress_id until then.
+        """
+        progress_id = f"preview-{uuid.uuid4().hex}"
+        job_id = self.submit(progress_id, track_pages, spotify_playlist_id, concurrency, mode='preview',
+                             options={'preview': True})
+        return job_id, progress_id
+
+    def commit_preview(self, job_id, title, description='Converted from Spotify'):
+        """
+        Create a YouTube Music playlist and write a completed preview's
+        matches into it, returning the playlist ID. The preview is claimed
+        before the playlist is created, so concurrent commits cannot leave an
+        empty playlist behind, and the job continues as a conversion of its
+        stored tracks, so resolved tracks are only added. Returns None if
+        job_id is not a completed preview, e.g. when it is already committed.
+        """
+        if not self.job_store.claim_preview(job_id):
+            return None
+        try:
+            ytm_playlist_id = self.ytmusic_service.create_playlist(title, description)
+        except Exception:
+            # Leave the preview committable again
+            self.job_store.release_preview(job_id)
+            raise
+        self.job_store.commit_preview(job_id, ytm_playlist_id)
+        self._start_heartbeat()
+        self.progress_broker.start(ytm_playlist_id, self._new_progress(ytm_playlist_id, job_id))
+        self.job_pool.submit(self._run_job, job_id, None)
+        return ytm_playlist_id
+
+    def resume_jobs(self):
+        """
+        Claim and requeue every job interrupted by a restart, or left by a
+        process whose lease expired, returning their IDs. Jobs another live
+        process holds are left alone.
+        """
+        self.take_over = True
+        self._start_heartbeat()
+        job_ids = []
+        for job in self.job_store.active_jobs():
+            if not self.job_store.claim_job(job['id']):
+                continue
+            logger.info("Resuming conversion job", extra={'job_id': job['id'], 'playlist_id': job['ytm_playlist_id']})
+            track_pages = None
+            if not job['tracks_complete'] and job['spotify_playlist_id'] and self.spotify_service:
+                # Continue fetching after the last stored page with public access
+                sp = self.spotify_service.get_spotify_client(use_auth=False)
+                track_pages = self.spotify_service.iter_playlist_track_pages(
+                    sp, job['spotify_playlist_id'], start_page=job['pages_fetched']
+                )
+            self.progress_broker.start(job['ytm_playlist_id'], self._new_progress(job['ytm_playlist_id'], job['id']))
+            self.job_pool.submit(self._run_job, job['id'], track_pages)
+            job_ids.append(job['id'])
+        return job_ids
+
+    def _start_heartbeat(self):
+        with self.lock:
+            if self.heartbeat is None:
+                self.heartbeat = threading.Thread(target=self._renew_leases, name='job-lease', daemon=True)
+                self.heartbeat.start()
+
+    def _renew_leases(self):
+        """Heartbeat body: keep this process's leases alive and pick up orphaned jobs"""
+        while True:
+            time.sleep(self.job_store.lease / 3)
+            try:
+                self.job_store.renew_leases()
+                if self.take_over:
+                    self.resume_jobs()
+            except Exception:
+                logger.exception("Job lease heartbeat failed")
+
+    def _run_job(self, job_id, track_pages):
+        """Job pool body: never lets a crash leave progress open"""
+        job = self.job_store.get_job(job_id)
+        with metrics.collect() as stages:
+            try:
+                self.job_store.set_status(job_id, 'running')
+                result = self.run(job, track_pages)
+                self.job_store.set_status(job_id, 'completed')
+                return result
+            except Exception as e:
+                logger.exception("Conversion job %s crashed", job_id, extra={'job_id': job_id})
+                self.job_store.set_status(job_id, 'failed', str(e))
+                progress = self.conversion_progress[job['ytm_playlist_id']]
+                progress['error'] = str(e)
+                progress['metrics'] = stages.summary()
+                self.job_store.save_metrics(job_id, progress['metrics'])
+                progress['completed'] = True
+                self._publish(job)
+
+    def submit_batch(self, sp, playlists, concurrency=None, description='Converted from Spotify'):
+        """
+        Convert several Spotify playlists at once and return the batch ID.
+        playlists is a list of dicts with an 'id' and optionally a 'name'.
+        A YouTube playlist is created for each one, and their jobs share one
+        search memo so tracks common to several playlists are searched once.
+        """
+        batch_id = f"batch-{uuid.uuid4().hex}"
+        batch = self.batches[batch_id] = BatchConversion(batch_id, self.progress_broker)
+        self.job_pool.submit(self._start_batch, batch, sp, playlists, concurrency, description)
+        return batch_id
+
+    def _start_batch(self, batch, sp, playlists, concurrency, description):
+        """Create the YouTube playlists of a batch and queue one job per playlist"""
+        try:
+            for playlist in playlists:
+                try:
+                    name = playlist.get('name') or sp.playlist(playlist['id'], fields='name')['name']
+                    ytm_playlist_id = self.ytmusic_service.create_playlist(name, description)
+                except Exception as e:
+                    logger.warning("Skipping playlist %s in %s: %s", playlist['id'], batch.batch_id, e)
+                    batch.progress['playlists'][playlist['id']] = {'error': str(e)}
+                    continue
+                batch.add_playlist(playlist['id'], ytm_playlist_id, name)
+                track_pages = self.spotify_service.iter_playlist_track_pages(sp, playlist['id'])
+                self.submit(
+                    ytm_playlist_id,
+                    track_pages,
+                    spotify_playlist_id=playlist['id'],
+                    concurrency=concurrency,
+                    options={'batch_id': batch.batch_id}
+                )
+        finally:
+            batch.submitted = True
+            if batch.update():
+                self.batches.pop(batch.batch_id, None)
+
+    def _publish(self, job):
+        """Publish a job's progress, and its batch aggregate if it belongs to one"""
+        self.progress_broker.publish(job['ytm_playlist_id'])
+        batch = self.batches.get(job['options'].get('batch_id'))
+        if batch and batch.update():
+            self.batches.pop(batch.batch_id, None)
+
+    def _finish_sync(self, job, progress):
+        """
+        Remove items no longer on Spotify if asked, then record the synced
+        snapshot. A track that failed with an error may still be in the
+        playlist without a videoId to keep it, and the next sync has to try
+        it again, so both are skipped when any track failed. Unmatched tracks
+        are final for this snapshot: it is recorded, and the items earlier
+        jobs added for them are kept.
+        """
+        playlist_id = job['ytm_playlist_id']
+        options = job['options']
+
+        failed = self.job_store.track_counts(job['id']).get('failed', 0)
+        if failed:
+            logger.warning("Sync left %d tracks failed, not removing items or recording the snapshot",
+                           failed, extra={'job_id': job['id'], 'playlist_id': playlist_id})
+            progress['removed'] = 0
+            return
+
+        if options.get('remove_missing'):
+            wanted = self.job_store.resolved_video_ids(job['id']) | self.job_store.unmatched_video_ids(job['id'])
+            stale = [item for item in self.ytmusic_service.get_playlist_items(playlist_id)
+                     if item['videoId'] not in wanted]
+            if stale:
+                logger.info("Removing tracks no longer on Spotify",
+                            extra={'playlist_id': playlist_id, 'removed': len(stale)})
+                self.ytmusic_service.remove_playlist_items(playlist_id, stale)
+            progress['removed'] = len(stale)
+
+        if options.get('snapshot_id') and job['spotify_playlist_id']:
+            self.job_store.set_snapshot(job['spotify_playlist_id'], playlist_id, options['snapshot_id'])
+
+    def _new_progress(self, playlist_id, job_id=None):
+        return {
+            'total': 0,
+            'processed': 0,
+            'added': 0,
+            'failed': 0,
+            'unmatched_cached': 0,
+            'completed': False,
+            'ytm_playlist_id': playlist_id,
+            'job_id': job_id
+        }
+
+    def _resolve(self, track, report_candidates=0):
+        """Search worker body: returns (video_id, confidence, candidates, error)"""
+        try:
+            video_id, confidence, candidates = self.ytmusic_service.match_track(track, report_candidates)
+            return video_id, confidence, candidates if report_candidates else None, None
+        except Exception as e:
+            return None, None, None, e
+
+    def _job_items(self, job, track_pages, progress):
+        """
+        Yield (position, track, state, video_id) for a job: first the tracks
+        already checkpointed in the store, then newly fetched pages, which
+        are stored before they are handed on.
+        """
+        for item in self.job_store.iter_tracks(job['id']):
+            progress['total'] += 1
+            yield item
+
+        if track_pages is not None:
+            for page in track_pages:
+                positions = self.job_store.append_page(job['id'], page)
+
+                # Total grows as Spotify pages arrive
+                progress['total'] += len(page)
+                self._publish(job)
+                for position, track in zip(positions, page):
+                    yield position, track, 'pending', None
+
+        self.job_store.mark_tracks_complete(job['id'])
+
+    def run(self, job, track_pages=None):
+        """
+        Stream a job's tracks into its YouTube Music playlist. Tracks (Track
+        records with a non-empty query) flow into the search workers as pages
+        arrive, and matches flow into the batched PlaylistWriter, so memory
+        use does not grow with the playlist size. Checkpointed tracks are
+        never searched or added again, and tracks in the negative match cache
+        are counted as 'unmatched_cached' without a search. Preview jobs stop
+        after resolution and count their matches as 'matched'.
+
+        Searches in flight are further capped by the YouTube Music service's
+        adaptive limit while it is throttled. Tracks whose search still failed
+        after retrying are searched once more when the rest of the job is
+        done, and recovered tracks are appended at the end of the playlist.
+        """
+        job_id = job['id']
+        playlist_id = job['ytm_playlist_id']
+        concurrency = self._concurrency(job['concurrency'])
+        progress = self.conversion_progress.get(playlist_id) or self.progress_broker.start(
+            playlist_id, self._new_progress(playlist_id, job_id)
+        )
+
+        # Batch jobs share searches with the other playlists of the batch
+        batch = self.batches.get(job['options'].get('batch_id'))
+        match_cache = self.ytmusic_service.match_cache
+
+        def publish():
+            self._publish(job)
+
+        def on_flush(added, rejected):
+            # Counters and checkpoints move once per flushed chunk
+            self.job_store.checkpoint_many(job_id, [position for _, position in added], 'added')
+            self.job_store.checkpoint_many(job_id, [position for _, position in rejected], 'failed')
+            progress['added'] += len(added)
+            progress['failed'] += len(rejected)
+            publish()
+
+        # Previews write nothing and keep the best candidates of each search
+        preview = job['mode'] == 'preview'
+        report_candidates = self.preview_candidates if preview else 0
+        writer = None
+        if preview:
+            progress['matched'] = 0
+        else:
+            writer = PlaylistWriter(
+                self.ytmusic_service.add_playlist_items,
+                playlist_id,
+                chunk_size=self.ytmusic_service.write_chunk_size,
+                flush_interval=self.ytmusic_service.write_flush_interval,
+                on_flush=on_flush
+            )
+
+        logger.info("Streaming tracks to YouTube Music playlist",
+                    extra={'playlist_id': playlist_id, 'job_id': job_id, 'concurrency': concurrency})
+
+        # Sync jobs only write what the playlist does not already contain
+        present = None
+        if job['mode'] == 'sync':
+            present = {item['videoId'] for item in self.ytmusic_service.get_playlist_items(playlist_id)}
+            progress['present'] = 0
+
+        in_flight = deque()
+        search_concurrency = self.ytmusic_service.search_concurrency
+        retry_queue = []
+        retrying = False
+
+        def collect():
+            # Consume the oldest item so tracks are written in order
+            position, track, future, video_id = in_flight.popleft()
+            if future:
+                video_id, confidence, candidates, error = future.result()
+                if error:
+                    logger.debug("Failed to resolve track '%s': %s", track.query, error)
+                    self.job_store.checkpoint(job_id, position, 'failed')
+                    progress['failed'] += 1
+                    if not retrying:
+                        retry_queue.append((position, track))
+                elif video_id:
+                    self.job_store.checkpoint(job_id, position, 'resolved', video_id, confidence, candidates)
+                else:
+                    logger.debug("No confident match found for track '%s' (%s)", track.query, confidence)
+                    self.job_store.checkpoint(job_id, position, 'unmatched', confidence=confidence,
+                                              candidates=candidates)
+                    progress['failed'] += 1
+            if preview:
+                if video_id:
+                    progress['matched'] += 1
+            elif video_id and present is not None and video_id in present:
+                self.job_store.checkpoint_many(job_id, [position], 'added')
+                progress['present'] += 1
+            elif video_id:
+                writer.add(video_id, position)
+                if present is not None:
+                    present.add(video_id)
+            progress['processed'] += 1
+            publish()
+            if writer:
+                writer.flush_if_due()
+
+        try:
+            for position, track, state, video_id in self._job_items(job, track_pages, progress):
+                if state == 'added':
+                    progress['added'] += 1
+                    progress['processed'] += 1
+                    publish()
+                elif state in ('unmatched', 'failed'):
+                    progress['failed'] += 1
+                    progress['processed'] += 1
+                    publish()
+                elif state == 'resolved':
+                    # Matched before the restart, only the write is left
+                    in_flight.append((position, track, None, video_id))
+                elif not track.query:
+                    self.job_store.checkpoint(job_id, position, 'failed')
+                    progress['failed'] += 1
+                    progress['processed'] += 1
+                    publish()
+                else:
+                    # Previews search every track so each one gets candidates
+                    missed = None if preview else match_cache.get_miss(track)
+                    if missed is not None:
+                        # Recently found unmatchable, skip the search
+                        self.job_store.checkpoint(job_id, position, 'unmatched', confidence=missed)
+                        progress['failed'] += 1
+                        progress['unmatched_cached'] += 1
+                        progress['processed'] += 1
+                        publish()
+                    else:
+                        # Searches run in the job's context so they count towards its stages
+                        resolve = metrics.in_context(self._resolve)
+                        if batch:
+                            future = batch.resolve(self.search_pool, resolve, track)
+                        else:
+                            future = self.search_pool.submit(resolve, track, report_candidates)
+                        in_flight.append((position, track, future, None))
+
+                if len(in_flight) >= min(concurrency, search_concurrency.limit):
+                    collect()
+
+            while in_flight:
+                collect()
+
+            if retry_queue:
+                # One more search for tracks that failed with an error
+                logger.info("Retrying failed tracks", extra={'job_id': job_id, 'tracks': len(retry_queue)})
+                retrying = True
+                progress['retried'] = len(retry_queue)
+                for position, track in retry_queue:
+                    progress['failed'] -= 1
+                    progress['processed'] -= 1
+                    future = self.search_pool.submit(metrics.in_context(self._resolve), track, report_candidates)
+                    in_flight.append((position, track, future, None))
+                    if len(in_flight) >= min(concurrency, search_concurrency.limit):
+                        collect()
+        finally:
+            # Whatever was resolved still gets written, even if fetching failed
+            while in_flight:
+                collect()
+
+            # Write the last partial chunk
+            if writer:
+                writer.close()
+
+        if job['mode'] == 'sync':
+            self._finish_sync(job, progress)
+
+        # Mark conversion as complete, with the job's per-stage summary
+        progress['average_confidence'] = self.job_store.average_confidence(job_id)
+        stages = metrics.job_registry()
+        if stages is not None:
+            progress['metrics'] = stages.summary()
+            self.job_store.save_metrics(job_id, progress['metrics'])
+        progress['completed'] = True
+        publish()
+
+        logger.info("Finished adding tracks", extra={
+            'job_id': job_id,
+            'added': progress['added'],
+            'failed': progress['failed'],
+            'stages': progress.get('metrics')
+        })
+        return {
+            'added': progress['added'],
+            'failed': progress['failed'],
+            'average_confidence': progress['average_confidence'],
+            'metrics': progress.get('metrics')
+        }
@@ -0,0 +1,373 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.services.track import Track
+
+
+class JobConflictError(Exception):
+    """Raised instead of creating a job for a playlist another job is still writing to"""
+
+    def __init__(self, ytm_playlist_id, job_id):
+        super().__init__(f"Playlist {ytm_playlist_id} already has job {job_id} in progress")
+        self.ytm_playlist_id = ytm_playlist_id
+        self.job_id = job_id
+
+
+class JobStore:
+    """
+    SQLite store for conversion jobs. Each job records its Spotify tracks as
+    they are fetched and a per-track checkpoint, so an interrupted job can be
+    resumed without searching or adding tracks twice.
+
+    Track states: pending -> resolved -> added, or unmatched / failed.
+    Jobs are plain conversions ('convert'), incremental syncs ('sync') or
+    previews ('preview') that stop at 'resolved' and keep each track's best
+    search candidates until they are committed as a conversion.
+
+    Every queued or running job is leased by the process running it, which
+    renews the lease while it is alive. Another process (e.g. another worker
+    or the next start) only takes a job over once it has claimed it, which
+    succeeds when the job has no owner or its lease has expired.
+    """
+
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    # Columns added after the first release, created on older databases
+    MIGRATIONS = (
+        ('job_tracks', 'confidence', 'REAL'),
+        ('jobs', 'mode', "TEXT NOT NULL DEFAULT 'convert'"),
+        ('jobs', 'options', 'TEXT'),
+        ('jobs', 'metrics', 'TEXT'),
+        ('job_tracks', 'candidates', 'TEXT'),
+        ('jobs', 'owner', 'TEXT'),
+        ('jobs', 'lease_until', 'REAL'),
+    )
+
+    def __init__(self, path=':memory:', lease=60.0):
+        self.path = path
+        self.lease = lease
+        # Identifies this process as the owner of the jobs it runs
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id TEXT PRIMARY KEY,'
+            ' ytm_playlist_id TEXT NOT NULL,'
+            ' spotify_playlist_id TEXT,'
+            ' status TEXT NOT NULL,'
+            ' concurrency INTEGER,'
+            ' pages_fetched INTEGER NOT NULL DEFAULT 0,'
+            ' tracks_complete INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS job_tracks ('
+            ' job_id TEXT NOT NULL,'
+            ' position INTEGER NOT NULL,'
+            ' track TEXT NOT NULL,'
+            ' state TEXT NOT NULL,'
+            ' video_id TEXT,'
+            ' confidence REAL,'
+            ' PRIMARY KEY (job_id, position));'
+            'CREATE TABLE IF NOT EXISTS sync_state ('
+            ' spotify_playlist_id TEXT NOT NULL,'
+            ' ytm_playlist_id TEXT NOT NULL,'
+            ' snapshot_id TEXT NOT NULL,'
+            ' synced_at REAL NOT NULL,'
+            ' PRIMARY KEY (spotify_playlist_id, ytm_playlist_id));'
+            'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);'
+        )
+        for table, column, definition in self.MIGRATIONS:
+            columns = [row[1] for row in self.conn.execute(f'PRAGMA table_info({table})')]
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        self.conn.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a store from the JOB_STORE_PATH and JOB_LEASE app settings"""
+        return cls(config['JOB_STORE_PATH'], lease=config['JOB_LEASE'])
+
+    def create_job(self, ytm_playlist_id, spotify_playlist_id=None, concurrency=None, mode='convert', options=None):
+        """
+        Record a new queued job, leased by this process, and return its ID.
+        Raises JobConflictError if a queued or running job already targets
+        the same YouTube playlist.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            # One statement, so two processes cannot both pass the check
+            cursor = self.conn.execute(
+                'INSERT INTO jobs (id, ytm_playlist_id, spotify_playlist_id, status, concurrency, mode, options,'
+                ' owner, lease_until, created_at, updated_at) SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?'
+                ' WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE ytm_playlist_id = ? AND status IN (?, ?))',
+                (job_id, ytm_playlist_id, spotify_playlist_id, 'queued', concurrency, mode,
+                 json.dumps(options or {}), self.owner, now + self.lease, now, now,
+                 ytm_playlist_id, *self.ACTIVE_STATUSES)
+            )
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                row = self.conn.execute(
+                    'SELECT id FROM jobs WHERE ytm_playlist_id = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1',
+                    (ytm_playlist_id, *self.ACTIVE_STATUSES)
+                ).fetchone()
+                raise JobConflictError(ytm_playlist_id, row['id'] if row else None)
+        return job_id
+
+    @staticmethod
+    def _job(row):
+        job = dict(row)
+        job['options'] = json.loads(job['options']) if job.get('options') else {}
+        job['metrics'] = json.loads(job['metrics']) if job.get('metrics') else None
+        return job
+
+    def get_job(self, job_id):
+        """Return a job row as a dict, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list_jobs(self, limit=50):
+        """Return the most recent jobs with their per-state track counts"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [dict(self._job(row), tracks=self.track_counts(row['id'])) for row in rows]
+
+    def active_jobs(self):
+        """Return queued or running jobs that no live process holds a lease on"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT * FROM jobs WHERE status IN (?, ?) AND (owner IS NULL OR lease_until < ?)'
+                ' ORDER BY created_at',
+                (*self.ACTIVE_STATUSES, time.time())
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def claim_job(self, job_id):
+        """
+        Take over a queued or running job that is unowned or whose lease has
+        expired. Returns False if another process holds it.
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                'UPDATE jobs SET owner = ?, lease_until = ?, updated_at = ?'
+                ' WHERE id = ? AND status IN (?, ?) AND (owner IS NULL OR lease_until < ?)',
+                (self.owner, now + self.lease, now, job_id, *self.ACTIVE_STATUSES, now)
+            )
+            self.conn.commit()
+        return cursor.rowcount == 1
+
+    def renew_leases(self):
+        """Extend the lease of every active job this process owns"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?)',
+                (now + self.lease, self.owner, *self.ACTIVE_STATUSES)
+            )
+            self.conn.commit()
+
+    def claim_preview(self, job_id):
+        """
+        Mark a completed preview as being committed. Returns False if the job
+        is not a completed preview, e.g. when another commit claimed it.
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'committing', updated_at = ?"
+                " WHERE id = ? AND mode = 'preview' AND status = 'completed'",
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+        return cursor.rowcount == 1
+
+    def release_preview(self, job_id):
+        """Return a claimed preview to 'completed' after its commit failed"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'completed', updated_at = ? WHERE id = ? AND status = 'committing'",
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def commit_preview(self, job_id, ytm_playlist_id):
+        """Turn a claimed preview into a queued conversion into ytm_playlist_id, leased by this process"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET ytm_playlist_id = ?, mode = 'convert', status = 'queued', owner = ?,"
+                " lease_until = ?, updated_at = ? WHERE id = ? AND status = 'committing'",
+                (ytm_playlist_id, self.owner, time.time() + self.lease, time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def set_status(self, job_id, status, error=None):
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                (status, error, time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def save_metrics(self, job_id, summary):
+        """Store a job's per-stage latency, error and retry summary"""
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET metrics = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(summary), time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def append_page(self, job_id, tracks):
+        """Store a fetched page of tracks and return their positions"""
+        with self.lock:
+            start = self.conn.execute(
+                'SELECT COUNT(*) FROM job_tracks WHERE job_id = ?', (job_id,)
+            ).fetchone()[0]
+            positions = list(range(start, start + len(tracks)))
+            self.conn.executemany(
+                'INSERT INTO job_tracks (job_id, position, track, state) VALUES (?, ?, ?, ?)',
+                [(job_id, position, json.dumps(track.to_dict()), 'pending') for position, track in zip(positions, tracks)]
+            )
+            self.conn.execute(
+                'UPDATE jobs SET pages_fetched = pages_fetched + 1, updated_at = ? WHERE id = ?',
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+        return positions
+
+    def mark_tracks_complete(self, job_id):
+        """Record that every Spotify page has been stored"""
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET tracks_complete = 1, updated_at = ? WHERE id = ?',
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def iter_tracks(self, job_id):
+        """Yield (position, track, state, video_id) for a job's stored tracks"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT position, track, state, video_id FROM job_tracks WHERE job_id = ? ORDER BY position',
+                (job_id,)
+            ).fetchall()
+        for row in rows:
+            yield row['position'], Track.from_dict(json.loads(row['track'])), row['state'], row['video_id']
+
+    def checkpoint(self, job_id, position, state, video_id=None, confidence=None, candidates=None):
+        """Record the resolution of a single track, its match confidence and, for previews, its candidates"""
+        with self.lock:
+            self.conn.execute(
+                'UPDATE job_tracks SET state = ?, video_id = ?, confidence = ?, candidates = ?'
+                ' WHERE job_id = ? AND position = ?',
+                (state, video_id, confidence, json.dumps(candidates) if candidates is not None else None,
+                 job_id, position)
+            )
+            self.conn.commit()
+
+    def checkpoint_many(self, job_id, positions, state):
+        """Move several tracks to the same state, e.g. after a flushed chunk"""
+        with self.lock:
+            self.conn.executemany(
+                'UPDATE job_tracks SET state = ? WHERE job_id = ? AND position = ?',
+                [(state, job_id, position) for position in positions]
+            )
+            self.conn.commit()
+
+    def resolved_video_ids(self, job_id):
+        """Return the set of videoIds a job resolved its tracks to"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT DISTINCT video_id FROM job_tracks WHERE job_id = ? AND video_id IS NOT NULL', (job_id,)
+            ).fetchall()
+        return {row['video_id'] for row in rows}
+
+    def unmatched_video_ids(self, job_id):
+        """
+        Return the videoIds earlier jobs on the same YouTube playlist added
+        for the Spotify tracks this job left unmatched
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT DISTINCT earlier.video_id FROM job_tracks AS earlier'
+                ' JOIN jobs ON jobs.id = earlier.job_id'
+                " WHERE jobs.ytm_playlist_id = (SELECT ytm_playlist_id FROM jobs WHERE id = ?)"
+                " AND earlier.job_id != ? AND earlier.state = 'added' AND earlier.video_id IS NOT NULL"
+                " AND json_extract(earlier.track, '$.id') IN ("
+                "  SELECT json_extract(track, '$.id') FROM job_tracks WHERE job_id = ? AND state = 'unmatched')",
+                (job_id, job_id, job_id)
+            ).fetchall()
+        return {row['video_id'] for row in rows}
+
+    def get_snapshot(self, spotify_playlist_id, ytm_playlist_id):
+        """Return the Spotify snapshot_id of the last successful sync, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT snapshot_id FROM sync_state WHERE spotify_playlist_id = ? AND ytm_playlist_id = ?',
+                (spotify_playlist_id, ytm_playlist_id)
+            ).fetchone()
+        return row['snapshot_id'] if row else None
+
+    def set_snapshot(self, spotify_playlist_id, ytm_playlist_id, snapshot_id):
+        """Record the Spotify snapshot_id a YouTube playlist is now in sync with"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sync_state (spotify_playlist_id, ytm_playlist_id, snapshot_id, synced_at)'
+                ' VALUES (?, ?, ?, ?)',
+                (spotify_playlist_id, ytm_playlist_id, snapshot_id, time.time())
+            )
+            self.conn.commit()
+
+    def track_results(self, job_id):
+        """Return every track of a job with its state, videoId, confidence and any preview candidates"""
+        results = []
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT position, track, state, video_id, confidence, candidates FROM job_tracks'
+                ' WHERE job_id = ? ORDER BY position',
+                (job_id,)
+            ).fetchall()
+        for row in rows:
+            track = json.loads(row['track'])
+            result = {
+                'position': row['position'],
+                'name': track.get('name'),
+                'artists': track.get('artists'),
+                'state': row['state'],
+                'video_id': row['video_id'],
+                'confidence': row['confidence']
+            }
+            if row['candidates'] is not None:
+                result['candidates'] = json.loads(row['candidates'])
+            results.append(result)
+        return results
+
+    def average_confidence(self, job_id):
+        """Return the mean confidence of a job's matched tracks"""
+        with self.lock:
+            value = self.conn.execute(
+                'SELECT AVG(confidence) FROM job_tracks WHERE job_id = ? AND video_id IS NOT NULL', (job_id,)
+            ).fetchone()[0]
+        return round(value, 3) if value is not None else None
+
+    def track_counts(self, job_id):
+        """Return the number of tracks in each state"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT state, COUNT(*) AS n FROM job_tracks WHERE job_id = ? GROUP BY state', (job_id,)
+            ).fetchall()
+        return {row['state']: row['n'] for row in rows}
@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import threading
+import time
+from app.services.normalize import canonical_artists, canonical_title
+
+
+class MatchCache:
+    """
+    Persistent cache mapping Spotify tracks to resolved YouTube Music videoIds.
+    Entries expire after `ttl` seconds and the least recently used entries are
+    evicted once the cache grows past `max_size`.
+
+    Tracks that found no confident match are remembered in a separate negative
+    cache for `negative_ttl` seconds, so they can be skipped without searching.
+    """
+
+    def __init__(self, path=':memory:', ttl=30 * 24 * 3600, max_size=50000, negative_ttl=3 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS matches ('
+            ' key TEXT PRIMARY KEY,'
+            ' video_id TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' confidence REAL)'
+        )
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(matches)')]
+        if 'confidence' not in columns:
+            self.conn.execute('ALTER TABLE matches ADD COLUMN confidence REAL')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS matches_last_used ON matches (last_used)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS misses ('
+            ' key TEXT PRIMARY KEY,'
+            ' confidence REAL,'
+            ' created_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COUNT(*) FROM matches').fetchone()[0]
+        self.negative_size = self.conn.execute('SELECT COUNT(*) FROM misses').fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a cache from the MATCH_CACHE_* app settings"""
+        return cls(
+            path=config['MATCH_CACHE_PATH'],
+            ttl=config['MATCH_CACHE_TTL'],
+            max_size=config['MATCH_CACHE_MAX_SIZE'],
+            negative_ttl=config['MATCH_CACHE_NEGATIVE_TTL']
+        )
+
+    @classmethod
+    def make_keys(cls, track):
+        """
+        Return the cache keys for a track, most specific first: the Spotify
+        track ID, then the canonical name and artists as a fallback, so
+        'feat.' credits and remaster suffixes do not split one recording
+        """
+        keys = []
+        if track.id:
+            keys.append(f"id:{track.id}")
+        name = canonical_title(track.name)
+        if name:
+            artists = ','.join(canonical_artists(track.artists))
+            keys.append(f"q:{name}|{artists}")
+        return keys
+
+    def get(self, track):
+        """Return the cached (videoId, confidence) for a track, or None on a miss"""
+        keys = self.make_keys(track)
+        if not keys:
+            return None
+
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                row = self.conn.execute(
+                    'SELECT video_id, confidence, created_at FROM matches WHERE key = ?', (key,)
+                ).fetchone()
+                if not row:
+                    continue
+                video_id, confidence, created_at = row
+                if now - created_at > self.ttl:
+                    self.conn.execute('DELETE FROM matches WHERE key = ?', (key,))
+                    self.conn.commit()
+                    self.size -= 1
+                    continue
+                self.conn.execute('UPDATE matches SET last_used = ? WHERE key = ?', (now, key))
+                self.conn.commit()
+                self.hits += 1
+                return video_id, confidence
+
+            self.misses += 1
+            return None
+
+    def set(self, track, video_id, confidence=None):
+        """Store the resolved videoId and its confidence under every key of the track"""
+        keys = self.make_keys(track)
+        if not keys or not video_id:
+            return
+
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                cursor = self.conn.execute(
+                    'UPDATE matches SET video_id = ?, confidence = ?, created_at = ?, last_used = ? WHERE key = ?',
+                    (video_id, confidence, now, now, key)
+                )
+                if cursor.rowcount == 0:
+                    self.conn.execute(
+                        'INSERT INTO matches (key, video_id, confidence, created_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                        (key, video_id, confidence, now, now)
+                    )
+                    self.size += 1
+            self._evict()
+
+            # A match supersedes any earlier miss
+            cursor = self.conn.executemany('DELETE FROM misses WHERE key = ?', [(key,) for key in keys])
+            self.negative_size -= max(0, cursor.rowcount)
+            self.conn.commit()
+
+    def get_miss(self, track):
+        """
+        Return the best confidence of a recent failed search for a track, or
+        None. A cached match under any of the track's keys takes precedence.
+        """
+        keys = self.make_keys(track)
+        if not keys:
+            return None
+
+        now = time.time()
+        with self.lock:
+            placeholders = ','.join('?' * len(keys))
+            if self.conn.execute(f'SELECT 1 FROM matches WHERE key IN ({placeholders})', keys).fetchone():
+                return None
+            for key in keys:
+                row = self.conn.execute('SELECT confidence, created_at FROM misses WHERE key = ?', (key,)).fetchone()
+                if not row:
+                    continue
+                confidence, created_at = row
+                if now - created_at > self.negative_ttl:
+                    self.conn.execute('DELETE FROM misses WHERE key = ?', (key,))
+                    self.conn.commit()
+                    self.negative_size -= 1
+                    continue
+                self.negative_hits += 1
+                return confidence or 0.0
+            return None
+
+    def set_miss(self, track, confidence=None):
+        """Remember that a track found no confident match"""
+        keys = self.make_keys(track)
+        if not keys:
+            return
+
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                cursor = self.conn.execute(
+                    'UPDATE misses SET confidence = ?, created_at = ? WHERE key = ?', (confidence, now, key)
+                )
+                if cursor.rowcount == 0:
+                    self.conn.execute(
+                        'INSERT INTO misses (key, confidence, created_at) VALUES (?, ?, ?)', (key, confidence, now)
+                    )
+                    self.negative_size += 1
+            self._evict_misses()
+            self.conn.commit()
+
+    def _evict_misses(self):
+        """Drop expired misses, then the oldest ones above max_size"""
+        if self.negative_size <= self.max_size:
+            return
+        cursor = self.conn.execute('DELETE FROM misses WHERE created_at < ?', (time.time() - self.negative_ttl,))
+        self.negative_size -= cursor.rowcount
+
+        overflow = self.negative_size - self.max_size
+        if overflow > 0:
+            cursor = self.conn.execute(
+                'DELETE FROM misses WHERE key IN (SELECT key FROM misses ORDER BY created_at ASC LIMIT ?)',
+                (overflow,)
+            )
+            self.negative_size -= cursor.rowcount
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones above max_size"""
+        if self.size <= self.max_size:
+            return
+        cursor = self.conn.execute('DELETE FROM matches WHERE created_at < ?', (time.time() - self.ttl,))
+        self.evictions += cursor.rowcount
+        self.size -= cursor.rowcount
+
+        overflow = self.size - self.max_size
+        if overflow > 0:
+            cursor = self.conn.execute(
+                'DELETE FROM matches WHERE key IN '
+                '(SELECT key FROM matches ORDER BY last_used ASC LIMIT ?)',
+                (overflow,)
+            )
+            self.evictions += cursor.rowcount
+            self.size -= cursor.rowcount
+
+    def clear(self):
+        """Remove every cached match and miss"""
+        with self.lock:
+            self.conn.execute('DELETE FROM matches')
+            self.conn.execute('DELETE FROM misses')
+            self.conn.commit()
+            self.size = 0
+            self.negative_size = 0
+
+    def stats(self):
+        """Return cache counters for diagnostics"""
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'sqlite',
+            'path': self.path if self.path == ':memory:' else os.path.abspath(self.path),
+            'size': self.size,
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'negative_size': self.negative_size,
+            'negative_ttl': self.negative_ttl,
+            'negative_hits': self.negative_hits
+        }
@@ -0,0 +1,100 @@
+from difflib import SequenceMatcher
+from app.services.normalize import normalize_text, strip_decorations, search_query
+
+
+# Words that mark a different recording when the Spotify title lacks them
+VERSION_MARKERS = ('live', 'cover', 'karaoke', 'instrumental', 'remix', 'acoustic', 'sped up', 'slowed', 'nightcore')
+
+# Relative weight of each signal in the final confidence
+TITLE_WEIGHT = 0.45
+ARTIST_WEIGHT = 0.35
+DURATION_WEIGHT = 0.2
+VERSION_PENALTY = 0.25
+
+# Duration delta (seconds) at which the duration score reaches zero
+DURATION_TOLERANCE = 30
+
+
+def query_variants(track):
+    """
+    Search queries to try for a track, most specific first: the title without
+    featured artists or remaster suffixes plus every artist, then the bare
+    title with the first artist
+    """
+    query = search_query(track)
+    variants = [query]
+    artists = track.artists
+    fallback = f"{strip_decorations(track.name)} {artists[0] if artists else ''}".strip()
+    if fallback and normalize_text(fallback) != normalize_text(query):
+        variants.append(fallback)
+    return variants
+
+
+class TrackFeatures:
+    """Normalized features of a Spotify track, computed once per track"""
+
+    __slots__ = ('title', 'title_tokens', 'artists', 'duration', 'markers')
+
+    def __init__(self, track):
+        self.title = normalize_text(strip_decorations(track.name))
+        self.title_tokens = set(self.title.split())
+        self.artists = {normalize_text(a) for a in track.artists}
+        duration_ms = track.duration_ms
+        self.duration = duration_ms / 1000 if duration_ms else None
+        full_title = normalize_text(track.name)
+        self.markers = {m for m in VERSION_MARKERS if m in full_title}
+
+
+def _candidate_features(candidate):
+    full_title = normalize_text(candidate.get('title'))
+    title = normalize_text(strip_decorations(candidate.get('title')))
+    artists = {normalize_text(a.get('name')) for a in candidate.get('artists') or [] if a.get('name')}
+    markers = {m for m in VERSION_MARKERS if m in full_title}
+    return title, set(title.split()), artists, candidate.get('duration_seconds'), markers
+
+
+def score_candidates(track, candidates, features=None):
+    """
+    Score every search candidate against a track in one pass and return a
+    list of (confidence, candidate) sorted best first. Confidence is in 0..1
+    and combines title similarity, artist overlap and duration delta, with a
+    penalty for live/cover/remix versions the Spotify track is not.
+    """
+    features = features or TrackFeatures(track)
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(features.title)
+
+    scored = []
+    for candidate in candidates:
+        if not candidate.get('videoId'):
+            continue
+        title, tokens, artists, duration, markers = _candidate_features(candidate)
+
+        # Title: blend of token overlap and character similarity
+        matcher.set_seq1(title)
+        union = features.title_tokens | tokens
+        token_score = len(features.title_tokens & tokens) / len(union) if union else 0.0
+        title_score = (token_score + matcher.ratio()) / 2
+
+        # Artists: share of Spotify artists found on the candidate
+        if features.artists:
+            artist_score = len(features.artists & artists) / len(features.artists)
+        else:
+            artist_score = 0.5
+
+        # Duration: linear falloff, neutral when either side is unknown
+        if features.duration and duration:
+            duration_score = max(0.0, 1 - abs(features.duration - duration) / DURATION_TOLERANCE)
+        else:
+            duration_score = 0.5
+
+        confidence = (TITLE_WEIGHT * title_score
+                      + ARTIST_WEIGHT * artist_score
+                      + DURATION_WEIGHT * duration_score)
+        if markers - features.markers:
+            confidence -= VERSION_PENALTY
+
+        scored.append((round(max(0.0, min(1.0, confidence)), 3), candidate))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
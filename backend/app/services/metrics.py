@@ -0,0 +1,177 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram bucket bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = 'playlist_converter'
+
+
+class StageStats:
+    """Latency histogram plus error and retry counters for one stage"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max', 'errors', 'retries')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.retries = 0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given quantile"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'calls': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'total_s': round(self.total, 3),
+            'mean_ms': round(self.total / self.count * 1000, 2) if self.count else None,
+            'p50_ms': round(self.quantile(0.5) * 1000, 2) if self.count else None,
+            'p99_ms': round(self.quantile(0.99) * 1000, 2) if self.count else None,
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe per-stage latency histograms, error and retry counters"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def _stage(self, stage):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats(self.buckets)
+        return stats
+
+    def observe(self, stage, seconds, error=False):
+        with self.lock:
+            self._stage(stage).observe(seconds, error)
+
+    def retry(self, stage):
+        with self.lock:
+            self._stage(stage).retries += 1
+
+    def summary(self):
+        """Per-stage call counts, errors, retries and latency quantiles"""
+        with self.lock:
+            return {stage: stats.summary() for stage, stats in sorted(self.stages.items())}
+
+    def render(self):
+        """Render every stage in the Prometheus text exposition format"""
+        latency = f'{PREFIX}_stage_latency_seconds'
+        lines = [
+            f'# HELP {latency} Latency of external API calls by stage.',
+            f'# TYPE {latency} histogram'
+        ]
+        with self.lock:
+            stages = sorted((stage, list(stats.counts), stats.count, stats.total, stats.errors, stats.retries)
+                            for stage, stats in self.stages.items())
+
+        for stage, counts, count, total, _, _ in stages:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{latency}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{latency}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{latency}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{latency}_count{{stage="{stage}"}} {count}')
+
+        for name, index, description in (('errors', 4, 'Failed external API calls by stage.'),
+                                         ('retries', 5, 'Retried external API calls by stage.')):
+            metric = f'{PREFIX}_stage_{name}_total'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for stage in stages:
+                lines.append(f'{metric}{{stage="{stage[0]}"}} {stage[index]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry served by /metrics
+registry = MetricsRegistry()
+
+# Registry of the job running in the current context, and the stage being timed
+_job_registry = contextvars.ContextVar('job_registry', default=None)
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+
+def job_registry():
+    """Return the registry of the job running in this context, or None"""
+    return _job_registry.get()
+
+
+@contextmanager
+def collect():
+    """Record the stages timed in this context into a new per-job registry too"""
+    job = MetricsRegistry()
+    token = _job_registry.set(job)
+    try:
+        yield job
+    finally:
+        _job_registry.reset(token)
+
+
+@contextmanager
+def timed(stage):
+    """Time an external call, counting it as an error if it raises"""
+    token = _current_stage.set(stage)
+    start = time.perf_counter()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_stage.reset(token)
+        registry.observe(stage, elapsed, error)
+        job = _job_registry.get()
+        if job is not None:
+            job.observe(stage, elapsed, error)
+
+
+def count_retry(stage=None):
+    """Count a retry against stage, or the stage currently being timed"""
+    stage = stage or _current_stage.get()
+    if not stage:
+        return
+    registry.retry(stage)
+    job = _job_registry.get()
+    if job is not None:
+        job.retry(stage)
+
+
+def in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, e.g. on a worker pool"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return run
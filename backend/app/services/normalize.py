@@ -0,0 +1,64 @@
+import re
+import unicodedata
+
+
+# Featured artist credits: "(feat. X)", "[ft. X]", "(with X)" or a trailing "feat. X"
+FEATURING = re.compile(
+    r'\s*[\(\[](?:feat\.?|ft\.?|featuring|with)\s[^\)\]]*[\)\]]'
+    r'|\s+(?:feat\.?|ft\.?|featuring)\s.*$',
+    re.IGNORECASE
+)
+
+# Release decorations that name the same recording: " - Remastered 2011",
+# "(2011 Remaster)", " - Mono", "[Deluxe Edition]", " - Bonus Track"
+EDITION = re.compile(
+    r'\s*(?:\s-\s|[\(\[])(?:(?!\s-\s)[^\(\)\[\]])*?'
+    r'\b(?:remaster(?:ed)?|mono|stereo|deluxe(?: edition)?|bonus track|anniversary edition|expanded edition)\b'
+    r'[^\(\)\[\]]*?[\)\]]?\s*$',
+    re.IGNORECASE
+)
+
+
+def normalize_text(value):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(c for c in value if not unicodedata.combining(c)).lower()
+    value = re.sub(r'[^\w\s]', ' ', value)
+    return re.sub(r'\s+', ' ', value).strip()
+
+
+def strip_decorations(title):
+    """Drop bracketed parts and ' - ...' suffixes such as '(feat. X)' or '- Remastered 2011'"""
+    title = re.sub(r'\s*[\(\[].*?[\)\]]', '', title or '')
+    return re.split(r'\s+-\s+', title)[0].strip()
+
+
+def clean_title(title):
+    """
+    Drop featured artist credits and remaster/edition suffixes from a title,
+    keeping parts that name a different recording such as '(Live)' or a remix
+    """
+    title = FEATURING.sub('', title or '')
+    while True:
+        cleaned = EDITION.sub('', title)
+        if cleaned == title:
+            return title.strip()
+        title = cleaned
+
+
+def canonical_title(title):
+    """Normalized title used to compare and cache tracks"""
+    return normalize_text(clean_title(title))
+
+
+def canonical_artists(artists):
+    """Sorted, de-duplicated, normalized artist names"""
+    return sorted({normalize_text(artist) for artist in artists or [] if normalize_text(artist)})
+
+
+def search_query(track):
+    """Search query for a track: its cleaned title followed by its artists"""
+    name = clean_title(track.name)
+    if not name:
+        return track.query
+    return f"{name} {' '.join(track.artists)}".strip()
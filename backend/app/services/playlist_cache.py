@@ -0,0 +1,266 @@
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from itertools import islice
+
+from app.services import metrics
+from app.services.track import Track
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A fetch in progress that other callers for the same key wait on"""
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _PageFetch:
+    """
+    A playlist's pages being fetched in the background, kept compressed as
+    they will be stored. Consumers read the pages as they arrive, each at
+    its own pace.
+    """
+
+    __slots__ = ('pages', 'raw_bytes', 'done', 'error', 'condition')
+
+    def __init__(self):
+        self.pages = []
+        self.raw_bytes = 0
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+
+class PlaylistCache:
+    """
+    Process-wide cache of Spotify playlist metadata and track lists, shared
+    by every user. Only public playlists are cached, so a private playlist
+    fetched with one user's token is never served to another.
+
+    Metadata is trusted for `fresh` seconds and then revalidated with a cheap
+    metadata request. Track lists are keyed by (playlist ID, snapshot_id), so
+    a changed playlist is simply a new key; each page is stored as its own
+    compressed JSON blob, so a list is replayed one page at a time, and the
+    least recently used lists are dropped above `max_bytes`.
+
+    Concurrent cold fetches of the same key are coalesced into one upstream
+    fetch. A track list is fetched in the background at Spotify's pace, so
+    callers sharing it never wait on each other's conversions.
+    """
+
+    # Upper bound on the number of playlists whose metadata is kept
+    MAX_METADATA = 10000
+
+    def __init__(self, fresh=300, max_bytes=64 * 1024 * 1024):
+        self.fresh = fresh
+        self.max_bytes = max_bytes
+        self.metadata_entries = OrderedDict()
+        self.track_entries = OrderedDict()
+        self.flights = {}
+        self.size = 0
+        self.metadata_hits = 0
+        self.metadata_misses = 0
+        self.track_hits = 0
+        self.track_misses = 0
+        self.coalesced = 0
+        self.bytes_saved = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a cache from the PLAYLIST_CACHE_* app settings"""
+        return cls(fresh=config['PLAYLIST_CACHE_FRESH'], max_bytes=config['PLAYLIST_CACHE_MAX_BYTES'])
+
+    @staticmethod
+    def cacheable(metadata):
+        """Public playlists and Spotify's own editorial playlists can be shared"""
+        return bool(metadata.get('public')) or (metadata.get('owner') or {}).get('id') == 'spotify'
+
+    def _join(self, key):
+        """Return (flight, leader): the caller leads a new fetch or waits on the running one"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = _Flight()
+                return flight, True
+            self.coalesced += 1
+            return flight, False
+
+    def _land(self, key, flight, result=None, error=None):
+        with self.lock:
+            self.flights.pop(key, None)
+        flight.result, flight.error = result, error
+        flight.event.set()
+
+    def metadata(self, playlist_id, fetch, revalidate=False):
+        """
+        Return a playlist's metadata, calling fetch() when it is missing,
+        older than `fresh` seconds or revalidate is set
+        """
+        if not revalidate:
+            with self.lock:
+                cached = self.metadata_entries.get(playlist_id)
+                if cached and time.monotonic() - cached[1] < self.fresh:
+                    self.metadata_hits += 1
+                    self.bytes_saved += cached[2]
+                    return cached[0]
+
+        key = ('metadata', playlist_id)
+        flight, leader = self._join(key)
+        if not leader:
+            flight.event.wait()
+            # Only a shareable result is reused; otherwise fetch with the caller's own client
+            if flight.error is None and self.cacheable(flight.result):
+                return flight.result
+            return fetch()
+
+        try:
+            metadata = fetch()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+        with self.lock:
+            self.metadata_misses += 1
+            if self.cacheable(metadata):
+                self.metadata_entries.pop(playlist_id, None)
+                self.metadata_entries[playlist_id] = (metadata, time.monotonic(), len(json.dumps(metadata)))
+                if len(self.metadata_entries) > self.MAX_METADATA:
+                    self.metadata_entries.popitem(last=False)
+            else:
+                self.metadata_entries.pop(playlist_id, None)
+        self._land(key, flight, result=metadata)
+        return metadata
+
+    def track_pages(self, playlist_id, snapshot_id, fetch_pages, start_page=0):
+        """
+        Yield a cacheable playlist's track pages from start_page, with the
+        same page boundaries as Spotify so page counts stay valid offsets.
+        fetch_pages(start_page) streams pages from Spotify.
+
+        A cached list is replayed. Otherwise the first caller starts a
+        background fetch of every page, which concurrent callers share; each
+        reads the pages as they arrive, and the list is stored as soon as the
+        fetch finishes, however fast the callers consume it. If the shared
+        fetch fails, each caller continues with its own fetch_pages.
+        """
+        key = ('tracks', playlist_id, snapshot_id)
+        pages = self._get_pages(key)
+        if pages is not None:
+            for blob in islice(pages, start_page, None):
+                yield self._unpack(blob)
+            return
+        if start_page:
+            yield from fetch_pages(start_page)
+            return
+
+        with self.lock:
+            fetch = self.flights.get(key)
+            if fetch is None:
+                fetch = self.flights[key] = _PageFetch()
+                thread = threading.Thread(
+                    target=metrics.in_context(self._fill), args=(key, fetch, fetch_pages),
+                    name='playlist-fetch', daemon=True
+                )
+                thread.start()
+            else:
+                self.coalesced += 1
+
+        index = 0
+        while True:
+            with fetch.condition:
+                while index >= len(fetch.pages) and not fetch.done:
+                    fetch.condition.wait()
+                blob = fetch.pages[index] if index < len(fetch.pages) else None
+                error = fetch.error
+            if blob is None:
+                if error is not None:
+                    logger.warning("Shared fetch of playlist %s failed, fetching it directly: %s", playlist_id, error)
+                    yield from fetch_pages(index)
+                return
+            yield self._unpack(blob)
+            index += 1
+
+    def _fill(self, key, fetch, fetch_pages):
+        """Background body of a shared fetch: compress every page, then store the list"""
+        try:
+            for page in fetch_pages(0):
+                blob, raw_bytes = self._pack(page)
+                with fetch.condition:
+                    fetch.pages.append(blob)
+                    fetch.raw_bytes += raw_bytes
+                    fetch.condition.notify_all()
+            self._store(key, fetch.pages, fetch.raw_bytes)
+        except Exception as e:
+            fetch.error = e
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            with fetch.condition:
+                fetch.done = True
+                fetch.condition.notify_all()
+
+    @staticmethod
+    def _pack(page):
+        """Return (blob, raw_bytes): a page of Tracks as compressed JSON"""
+        raw = json.dumps([track.to_dict() for track in page], separators=(',', ':')).encode()
+        return zlib.compress(raw), len(raw)
+
+    @staticmethod
+    def _unpack(blob):
+        return [Track.from_dict(track) for track in json.loads(zlib.decompress(blob))]
+
+    def _get_pages(self, key):
+        """Return a cached list's compressed pages, or None"""
+        with self.lock:
+            entry = self.track_entries.get(key)
+            if entry is None:
+                return None
+            self.track_entries.move_to_end(key)
+            self.track_hits += 1
+            self.bytes_saved += entry[1]
+        return entry[0]
+
+    def _store(self, key, pages, raw_bytes):
+        pages = tuple(pages)
+        size = sum(len(blob) for blob in pages)
+        with self.lock:
+            self.track_misses += 1
+            # Older snapshots of the same playlist are stale now
+            for stale in [k for k in self.track_entries if k[1] == key[1] and k != key]:
+                self.size -= self.track_entries.pop(stale)[2]
+            if key in self.track_entries:
+                self.size -= self.track_entries.pop(key)[2]
+            self.track_entries[key] = (pages, raw_bytes, size)
+            self.size += size
+            while self.size > self.max_bytes and len(self.track_entries) > 1:
+                _, (_, _, evicted) = self.track_entries.popitem(last=False)
+                self.size -= evicted
+
+    def stats(self):
+        """Return cache counters for diagnostics"""
+        with self.lock:
+            hits = self.metadata_hits + self.track_hits
+            lookups = hits + self.metadata_misses + self.track_misses
+            return {
+                'playlists': len(self.metadata_entries),
+                'track_lists': len(self.track_entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'fresh': self.fresh,
+                'metadata_hits': self.metadata_hits,
+                'metadata_misses': self.metadata_misses,
+                'track_hits': self.track_hits,
+                'track_misses': self.track_misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round(hits / lookups, 3) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved
+            }
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+
+from app.services.resilience import is_transient_error
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistWriter:
+    """
+    Buffers resolved videoIds and adds them to a YouTube Music playlist in
+    chunks. A chunk is flushed once it holds `chunk_size` items or its oldest
+    item has waited `flush_interval` seconds. Rejected chunks are retried by
+    bisection so a single bad videoId only fails itself. Transient errors,
+    such as throttling or an open circuit, say nothing about the items and
+    are raised instead of splitting the chunk.
+
+    Each videoId may carry a tag (e.g. its track position); on_flush receives
+    the (video_id, tag) pairs that were added and rejected by every chunk.
+    """
+
+    def __init__(self, add_items, playlist_id, chunk_size=50, flush_interval=5.0, on_flush=None):
+        self.add_items = add_items
+        self.playlist_id = playlist_id
+        self.chunk_size = max(1, chunk_size)
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.buffer = []
+        self.buffered_since = None
+        self.added = 0
+        self.failed = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def add(self, video_id, tag=None):
+        """Queue a videoId, flushing if the chunk is full or overdue"""
+        with self.lock:
+            if not self.buffer:
+                self.buffered_since = time.monotonic()
+            self.buffer.append((video_id, tag))
+            due = len(self.buffer) >= self.chunk_size or self._overdue()
+        if due:
+            self.flush()
+
+    def flush_if_due(self):
+        """Flush the pending chunk if it has waited past flush_interval"""
+        with self.lock:
+            due = self._overdue()
+        if due:
+            self.flush()
+
+    def _overdue(self):
+        return bool(self.buffer) and time.monotonic() - self.buffered_since >= self.flush_interval
+
+    def flush(self):
+        """Write every buffered videoId, one chunk at a time"""
+        with self.lock:
+            pending, self.buffer = self.buffer, []
+            self.buffered_since = None
+
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            added, rejected = self._write(chunk)
+            self.added += len(added)
+            self.failed += len(rejected)
+            if self.on_flush:
+                self.on_flush(added, rejected)
+
+    def close(self):
+        """Flush whatever is left and return the totals"""
+        self.flush()
+        return {'added': self.added, 'failed': self.failed, 'requests': self.requests}
+
+    def _write(self, chunk):
+        """Add a chunk, bisecting on rejection. Returns (added, rejected) item lists"""
+        self.requests += 1
+        try:
+            response = self.add_items(self.playlist_id, [video_id for video_id, _ in chunk])
+            if isinstance(response, dict) and response.get('status', 'STATUS_SUCCEEDED') != 'STATUS_SUCCEEDED':
+                raise Exception(f"Playlist rejected chunk: {response.get('status')}")
+            return chunk, []
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            if len(chunk) == 1:
+                logger.warning("Failed to add video %s: %s", chunk[0][0], e)
+                return [], chunk
+            middle = len(chunk) // 2
+            left_added, left_rejected = self._write(chunk[:middle])
+            right_added, right_rejected = self._write(chunk[middle:])
+            return left_added + right_added, left_rejected + right_rejected
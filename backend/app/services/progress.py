@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+
+class ProgressBroker:
+    """
+    Publishes conversion progress to blocking subscribers. Writers mutate the
+    progress dict of a key and call publish(); every publish bumps the key's
+    event ID and wakes the subscribers waiting on that key. Progress entries
+    are cumulative snapshots, so a subscriber only ever needs the latest one.
+
+    Finished entries are dropped `retention` seconds after completion.
+
+    Subscribers on an asyncio event loop use wait_async(), which is woken via
+    the loop instead of holding a thread while it waits.
+    """
+
+    def __init__(self, retention=600):
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.progress = {}
+        self.versions = {}
+        self.conditions = {}
+        self.async_waiters = {}
+        self.finished_at = {}
+
+    def _condition(self, key):
+        condition = self.conditions.get(key)
+        if condition is None:
+            condition = self.conditions[key] = threading.Condition(self.lock)
+        return condition
+
+    def start(self, key, progress):
+        """Register a fresh progress dict for key and publish it"""
+        with self.lock:
+            self._cleanup()
+            self.progress[key] = progress
+            self.finished_at.pop(key, None)
+        self.publish(key)
+        return progress
+
+    def get(self, key):
+        return self.progress.get(key)
+
+    def publish(self, key):
+        """Signal that the progress for key changed"""
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            progress = self.progress.get(key)
+            if progress and progress.get('completed'):
+                self.finished_at.setdefault(key, time.monotonic())
+            self._condition(key).notify_all()
+            self._wake_async(key)
+
+    def _wake_async(self, key):
+        for loop, event in self.async_waiters.get(key, ()):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's loop has already closed
+                pass
+
+    def wait(self, key, last_event_id=None, timeout=None):
+        """
+        Block until key has an event newer than last_event_id. Returns
+        (event_id, snapshot), or None if nothing changed within timeout.
+        """
+        with self.lock:
+            condition = self._condition(key)
+            changed = condition.wait_for(
+                lambda: key in self.progress and self.versions.get(key) != last_event_id,
+                timeout=timeout
+            )
+            if not changed:
+                return None
+            return self.versions[key], dict(self.progress[key])
+
+    async def wait_async(self, key, last_event_id=None, timeout=None):
+        """Coroutine version of wait() for subscribers on an event loop"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        deadline = loop.time() + timeout if timeout is not None else None
+        with self.lock:
+            self.async_waiters.setdefault(key, set()).add(waiter)
+        try:
+            while True:
+                with self.lock:
+                    if key in self.progress and self.versions.get(key) != last_event_id:
+                        return self.versions[key], dict(self.progress[key])
+                    # Cleared under the lock, so a publish from now on sets it again
+                    event.clear()
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return None
+        finally:
+            with self.lock:
+                waiters = self.async_waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self.async_waiters[key]
+
+    def _cleanup(self):
+        """Drop entries that finished more than `retention` seconds ago"""
+        cutoff = time.monotonic() - self.retention
+        for key in [key for key, finished in self.finished_at.items() if finished < cutoff]:
+            self.progress.pop(key, None)
+            self.versions.pop(key, None)
+            self.finished_at.pop(key, None)
+            condition = self.conditions.pop(key, None)
+            if condition:
+                condition.notify_all()
+            self._wake_async(key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tracked': len(self.progress),
+                'finished': len(self.finished_at),
+                'async_subscribers': sum(len(waiters) for waiters in self.async_waiters.values())
+            }
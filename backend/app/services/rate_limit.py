@@ -0,0 +1,86 @@
+import threading
+import time
+
+
+def is_throttle_error(error):
+    """Best-effort check for rate limiting errors raised by the API clients"""
+    message = str(error).lower()
+    return any(marker in message for marker in ('429', 'too many requests', 'rate limit', 'quota'))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate` tokens are added per second up to
+    `capacity`; acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def slow_down(self, factor=0.5, floor=0.5):
+        """Reduce the refill rate after a throttling response"""
+        with self.lock:
+            self.rate = max(floor, self.rate * factor)
+
+    def speed_up(self, step=0.1):
+        """Recover the refill rate towards its configured maximum"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * step)
+
+
+class AdaptiveBackoff:
+    """
+    Shared backoff delay that doubles on every throttling error and decays on
+    success, and slows the attached token bucket down while throttled.
+    """
+
+    def __init__(self, bucket=None, base_delay=1.0, max_delay=60.0):
+        self.bucket = bucket
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def failure(self):
+        """Record a throttling error"""
+        with self.lock:
+            self.throttled += 1
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+        if self.bucket:
+            self.bucket.slow_down()
+
+    def success(self):
+        """Record a successful call"""
+        with self.lock:
+            if self.delay:
+                self.delay = self.delay / 2 if self.delay / 2 >= self.base_delay else 0.0
+        if self.bucket and self.bucket.rate < self.bucket.max_rate:
+            self.bucket.speed_up()
+
+    def stats(self):
+        return {
+            'delay': round(self.delay, 3),
+            'throttled': self.throttled,
+            'rate': round(self.bucket.rate, 3) if self.bucket else None
+        }
@@ -0,0 +1,260 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from app.services import metrics
+from app.services.rate_limit import is_throttle_error
+
+logger = logging.getLogger(__name__)
+
+# Markers of server-side or network errors worth retrying
+TRANSIENT_MARKERS = (
+    'http 500', 'http 502', 'http 503', 'http 504', 'internal server error', 'bad gateway',
+    'service unavailable', 'gateway timeout', 'timed out', 'connection reset', 'connection aborted',
+    'temporarily unavailable'
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _status(error):
+    """HTTP status carried by a spotipy or requests error, if any"""
+    status = getattr(error, 'http_status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def is_transient_error(error):
+    """Throttling, 5xx, timeout and connection errors, which may succeed when retried"""
+    if isinstance(error, (CircuitOpenError, ConnectionError, TimeoutError)) or is_throttle_error(error):
+        return True
+    status = _status(error)
+    if status:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    if 'Timeout' in name or name == 'ConnectionError':
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+def retry_after(error):
+    """Seconds to wait from an error's Retry-After header or open circuit, or None"""
+    if isinstance(error, CircuitOpenError):
+        return error.retry_in
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None)
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint after `failure_threshold` consecutive transient
+    failures. While open, calls fail fast with CircuitOpenError; after
+    `reset_timeout` seconds one trial call is let through (half-open), and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.trips = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def before(self):
+        """Raise CircuitOpenError unless a call may go ahead now"""
+        with self.lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self.trial:
+                self.trial = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.name, max(remaining, 0.1))
+
+    def success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                    logger.warning("Circuit for %s opened after %d failures", self.name, self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures, 'trips': self.trips, 'rejected': self.rejected}
+
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase, multiplicative-decrease limit on calls in flight. The
+    limit halves on a throttling error (at most once per `cooldown` seconds,
+    so one burst of 429s counts once) and grows by one after every
+    `increase_after` successes, up to max_limit.
+    """
+
+    def __init__(self, max_limit, min_limit=1, increase_after=20, cooldown=1.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = min(min_limit, self.max_limit)
+        self.limit = self.max_limit
+        self.increase_after = increase_after
+        self.cooldown = cooldown
+        self.successes = 0
+        self.decreased_at = 0.0
+        self.decreases = 0
+        self.lock = threading.Lock()
+
+    def throttled(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.decreased_at < self.cooldown:
+                return
+            self.decreased_at = now
+            self.decreases += 1
+            self.successes = 0
+            self.limit = max(self.min_limit, self.limit // 2)
+
+    def succeeded(self):
+        with self.lock:
+            if self.limit >= self.max_limit:
+                return
+            self.successes += 1
+            if self.successes >= self.increase_after:
+                self.successes = 0
+                self.limit += 1
+
+    def stats(self):
+        return {'limit': self.limit, 'max_limit': self.max_limit, 'decreases': self.decreases}
+
+
+class Resilience:
+    """
+    Retry policy and per-endpoint circuit breakers shared by a service's
+    external calls. Idempotent calls are retried on any transient error,
+    other calls only on throttling, which means the request was not applied.
+    Retries wait for a full-jitter exponential backoff, or for the server's
+    Retry-After when it asks for longer.
+    """
+
+    def __init__(self, retries=3, base_delay=0.5, max_delay=30.0, failure_threshold=5, reset_timeout=30.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self.retried = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a policy from the RETRY_* and CIRCUIT_* app settings"""
+        return cls(
+            retries=config['RETRY_ATTEMPTS'],
+            base_delay=config['RETRY_BASE_DELAY'],
+            max_delay=config['RETRY_MAX_DELAY'],
+            failure_threshold=config['CIRCUIT_FAILURE_THRESHOLD'],
+            reset_timeout=config['CIRCUIT_RESET_TIMEOUT']
+        )
+
+    def breaker(self, endpoint):
+        """The circuit breaker of an endpoint, created on first use"""
+        with self.lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = self.breakers[endpoint] = CircuitBreaker(
+                    endpoint, self.failure_threshold, self.reset_timeout
+                )
+            return breaker
+
+    def delay(self, attempt, error):
+        """Seconds to wait before retry number attempt + 1"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hinted = retry_after(error)
+        if hinted is not None:
+            backoff = max(backoff, hinted)
+        return min(self.max_delay, backoff)
+
+    def call(self, endpoint, fn, idempotent=True, concurrency=None, retry_on=None):
+        """
+        Call fn() through the endpoint's circuit breaker, retrying as the
+        policy allows. Throttling errors also lower `concurrency`, an
+        AdaptiveConcurrency, and successes raise it again. retry_on can widen
+        the errors worth retrying. Retries are counted against the endpoint's
+        metrics stage.
+        """
+        breaker = self.breaker(endpoint)
+        for attempt in range(self.retries + 1):
+            try:
+                breaker.before()
+                result = fn()
+            except Exception as e:
+                transient = is_transient_error(e)
+                if isinstance(e, CircuitOpenError):
+                    pass
+                elif transient:
+                    breaker.failure()
+                else:
+                    # Any other answer shows the endpoint is up
+                    breaker.success()
+                throttled = is_throttle_error(e)
+                if throttled and concurrency:
+                    concurrency.throttled()
+
+                retryable = transient if idempotent else throttled
+                if retry_on and retry_on(e):
+                    retryable = True
+                if not retryable or attempt == self.retries:
+                    raise
+                delay = self.delay(attempt, e)
+                logger.warning("%s failed, retrying in %.2fs: %s", endpoint, delay, e)
+                with self.lock:
+                    self.retried += 1
+                metrics.count_retry(endpoint)
+                time.sleep(delay)
+            else:
+                breaker.success()
+                if concurrency:
+                    concurrency.succeeded()
+                return result
+
+    def stats(self):
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {
+            'retries': self.retried,
+            'breakers': {name: breaker.stats() for name, breaker in breakers.items()}
+        }
@@ -1,8 +1,22 @@
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
 from flask import current_app, session, url_for, request
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from app.services import metrics
+from app.services.playlist_cache import PlaylistCache
+from app.services.resilience import Resilience, AdaptiveConcurrency
+from app.services.track import Track
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 class SpotifyService:
+    # Pagination and field projection for playlist reads
+    TRACKS_PAGE_SIZE = 100
+    PLAYLISTS_PAGE_SIZE = 50
+    TRACK_FIELDS = 'total,items(track(id,name,duration_ms,external_ids(isrc),album(name),artists(name)))'
+    PLAYLIST_FIELDS = 'id,name,snapshot_id,public,owner(id),images,tracks(total)'
+    
     def __init__(self, app=None):
         if app:
             self.init_app(app)
@@ -12,27 +26,52 @@ class SpotifyService:
         self.client_secret = app.config['SPOTIFY_CLIENT_SECRET']
         self.redirect_uri = app.config['SPOTIFY_REDIRECT_URI']
         self.scope = 'playlist-read-private playlist-read-collaborative'
+        self.page_workers = app.config['SPOTIFY_PAGE_WORKERS']
+        self.pool_size = app.config['SPOTIFY_POOL_SIZE']
+        
+        # Public playlist metadata and track lists shared by every user
+        self.playlist_cache = PlaylistCache.from_config(app.config)
+        
+        # Retries, circuit breakers and a page fetch limit that backs off when throttled
+        self.resilience = Resilience.from_config(app.config)
+        self.page_concurrency = AdaptiveConcurrency(self.page_workers)
+        
+        # The client pool (and spotipy itself) is loaded on first use
+        self._clients = None
+        self._clients_lock = threading.Lock()
+    
+    @property
+    def clients(self):
+        """Shared session, token managers and per-user clients"""
+        if self._clients is None:
+            with self._clients_lock:
+                if self._clients is None:
+                    from app.services.spotify_clients import SpotifyClientPool
+                    self._clients = SpotifyClientPool(
+                        self.client_id,
+                        self.client_secret,
+                        self.redirect_uri,
+                        self.scope,
+                        pool_size=self.pool_size
+                    )
+        return self._clients
+    
+    def client_stats(self):
+        """Client pool counters, or None while the pool has not been built"""
+        clients = self._clients
+        return clients.stats() if clients is not None else None
     
     def get_auth_url(self):
         """Generate the authorization URL for Spotify"""
-        sp_oauth = SpotifyOAuth(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            redirect_uri=self.redirect_uri,
-            scope=self.scope
-        )
-        auth_url = sp_oauth.get_authorize_url()
+        auth_url = self.clients.oauth.get_authorize_url()
         return auth_url
     
     def get_token(self, code):
         """Exchange authorization code for access token"""
-        sp_oauth = SpotifyOAuth(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            redirect_uri=self.redirect_uri,
-            scope=self.scope
-        )
-        token_info = sp_oauth.get_access_token(code)
+        # Skip the shared cache so one user's token is never handed to another
+        oauth = self.clients.oauth
+        with metrics.timed('spotify_token'):
+            token_info = oauth.get_access_token(code, check_cache=False)
         return token_info
     
     def get_spotify_client(self, use_auth=True):
@@ -41,37 +80,29 @@ class SpotifyService:
             token_info = session.get('token_info', None)
             if not token_info:
                 raise Exception("No token available. Please login first.")
-            return spotipy.Spotify(auth=token_info['access_token'])
+            return self.clients.get_user_client(token_info['access_token'])
         else:
             # Client credentials flow - only for public data
-            client_credentials_manager = SpotifyClientCredentials(
-                client_id=self.client_id,
-                client_secret=self.client_secret
-            )
-            return spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+            return self.clients.get_public_client()
     
     def get_playlists(self, use_auth=True):
         """Get user's playlists (requires auth) or a specific public playlist"""
         sp = self.get_spotify_client(use_auth)
         
         if use_auth:
-            # Get authenticated user's playlists
+            # Get authenticated user's playlists, remaining pages in parallel
             playlists = []
-            results = sp.current_user_playlists()
+            def fetch_page(offset):
+                return sp.current_user_playlists(limit=self.PLAYLISTS_PAGE_SIZE, offset=offset)
             
-            while results:
-                for item in results['items']:
+            for page in self._iter_pages(fetch_page, self.PLAYLISTS_PAGE_SIZE):
+                for item in page['items']:
                     playlists.append({
                         'id': item['id'],
                         'name': item['name'],
                         'tracks': item['tracks']['total'],
                         'image': item['images'][0]['url'] if item['images'] else None
                     })
-                
-                if results['next']:
-                    results = sp.next(results)
-                else:
-                    break
                     
             return playlists
         
@@ -80,15 +111,9 @@ class SpotifyService:
     def get_public_playlist(self, playlist_id):
         """Get a specific public playlist without authentication"""
         try:
-            # Create a fresh client with client credentials flow specifically for this request
-            client_credentials_manager = SpotifyClientCredentials(
-                client_id=self.client_id,
-                client_secret=self.client_secret
-            )
-            sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-            
-            # Add market parameter which helps with region-restricted content
-            playlist = sp.playlist(playlist_id, market="US")
+            # Shared client credentials client
+            sp = self.clients.get_public_client()
+            playlist = self.get_playlist_metadata(sp, playlist_id)
             
             return {
                 'id': playlist['id'],
@@ -97,52 +122,112 @@ class SpotifyService:
                 'image': playlist['images'][0]['url'] if playlist['images'] else None
             }
         except Exception as e:
-            print(f"Error fetching playlist {playlist_id}: {str(e)}")
+            logger.warning("Error fetching playlist %s: %s", playlist_id, e)
             return {"error": f"Could not access playlist: {str(e)}"}
     
+    def get_playlist_metadata(self, sp, playlist_id, revalidate=False):
+        """
+        Get a playlist's name, snapshot_id, visibility, images and track count
+        without its tracks. Public playlists are served from the shared cache
+        until they are due for revalidation.
+        """
+        def fetch():
+            # Add market parameter which helps with region-restricted content
+            with metrics.timed('spotify_metadata'):
+                return sp.playlist(playlist_id, fields=self.PLAYLIST_FIELDS, market="US")
+        
+        return self.playlist_cache.metadata(
+            playlist_id, lambda: self.resilience.call('spotify_metadata', fetch), revalidate
+        )
+    
+    def get_snapshot_id(self, sp, playlist_id):
+        """Get a playlist's current snapshot_id, a cheap check for changes"""
+        return self.get_playlist_metadata(sp, playlist_id, revalidate=True)['snapshot_id']
+    
+    def get_tracks_client(self, use_auth=True):
+        """Get the client used to read playlist tracks, falling back to public access"""
+        if use_auth and session.get('token_info'):
+            return self.clients.get_user_client(session['token_info']['access_token'])
+        
+        # Client credentials for public playlists
+        return self.clients.get_public_client()
+    
     def get_playlist_tracks(self, playlist_id, use_auth=True):
-        """Get all tracks from a playlist"""
-        try:
-            # For playlist tracks, create a fresh client to avoid session issues
-            if use_auth:
-                token_info = session.get('token_info', None)
-                if not token_info:
-                    # Fall back to client credentials for public playlists
-                    client_credentials_manager = SpotifyClientCredentials(
-                        client_id=self.client_id,
-                        client_secret=self.client_secret
-                    )
-                    sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-                else:
-                    sp = spotipy.Spotify(auth=token_info['access_token'])
-            else:
-                client_credentials_manager = SpotifyClientCredentials(
-                    client_id=self.client_id,
-                    client_secret=self.client_secret
-                )
-                sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-            
-            # Try with market parameter
-            tracks = []
-            results = sp.playlist_tracks(playlist_id, market="US")
-            
-            while results:
-                for item in results['items']:
-                    track = item.get('track')
-                    if track:
-                        artist_names = [artist['name'] for artist in track['artists']]
-                        tracks.append({
-                            'name': track['name'],
-                            'artists': artist_names,
-                            'query': f"{track['name']} {' '.join(artist_names)}"
-                        })
-                
-                if results.get('next'):
-                    results = sp.next(results)
-                else:
-                    break
-                    
-            return tracks
-        except Exception as e:
-            print(f"Error getting tracks for playlist {playlist_id}: {str(e)}")
-            return []
\ No newline at end of file
+        """
+        Get all tracks from a playlist as Track records. Errors left after
+        retrying are raised, so a failed fetch is never mistaken for an empty
+        playlist.
+        """
+        sp = self.get_tracks_client(use_auth)
+        
+        tracks = []
+        for page in self.iter_playlist_track_pages(sp, playlist_id):
+            tracks.extend(page)
+        
+        return tracks
+    
+    def iter_playlist_track_pages(self, sp, playlist_id, start_page=0):
+        """
+        Yield a playlist's tracks one page of Track records at a time, in
+        playlist order, starting at start_page. The snapshot_id is rechecked
+        first, and public playlists are replayed from the shared cache when
+        that snapshot is cached; concurrent first fetches of one playlist
+        share a single upstream fetch.
+        """
+        metadata = self.get_playlist_metadata(sp, playlist_id, revalidate=True)
+        if self.playlist_cache.cacheable(metadata):
+            yield from self.playlist_cache.track_pages(
+                playlist_id,
+                metadata['snapshot_id'],
+                lambda start: self._fetch_track_pages(sp, playlist_id, start),
+                start_page
+            )
+            return
+        
+        yield from self._fetch_track_pages(sp, playlist_id, start_page)
+    
+    def _fetch_track_pages(self, sp, playlist_id, start_page=0):
+        """
+        Fetch a playlist's tracks page by page from Spotify. Once the first
+        page reports the total, the remaining pages are fetched concurrently.
+        """
+        def fetch_page(offset):
+            # Try with market parameter, requesting only the fields we use
+            return sp.playlist_items(
+                playlist_id,
+                fields=self.TRACK_FIELDS,
+                limit=self.TRACKS_PAGE_SIZE,
+                offset=offset,
+                market="US"
+            )
+        
+        for page in self._iter_pages(fetch_page, self.TRACKS_PAGE_SIZE, start_page * self.TRACKS_PAGE_SIZE):
+            yield [Track.from_spotify(item['track']) for item in page['items'] if item.get('track')]
+    
+    def _iter_pages(self, fetch_page, page_size, start=0):
+        """
+        Yield every page of an offset-paginated endpoint in order. The first
+        page is fetched alone to learn the total, then at most page_workers
+        further pages are in flight at once, fewer while Spotify throttles.
+        Every fetch is retried as the 'spotify_page' endpoint and each attempt
+        is timed as that stage.
+        """
+        def timed_fetch(offset):
+            def attempt():
+                with metrics.timed('spotify_page'):
+                    return fetch_page(offset)
+            return self.resilience.call('spotify_page', attempt, concurrency=self.page_concurrency)
+        
+        first = timed_fetch(start)
+        yield first
+        
+        offsets = deque(range(start + page_size, first.get('total') or 0, page_size))
+        if not offsets:
+            return
+        
+        with ThreadPoolExecutor(max_workers=self.page_workers, thread_name_prefix='spotify-page') as pool:
+            pending = deque()
+            while offsets or pending:
+                while offsets and len(pending) < self.page_concurrency.limit:
+                    pending.append(pool.submit(metrics.in_context(timed_fetch), offsets.popleft()))
+                yield pending.popleft().result()
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import MemoryCacheHandler
+from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
+from urllib3.util.retry import Retry
+
+from app.services import metrics
+
+
+class CountedRetry(Retry):
+    """Retry policy that counts each retry against the stage being timed"""
+
+    def increment(self, *args, **kwargs):
+        # Raises once the retries are exhausted, so only real retries are counted
+        retry = super().increment(*args, **kwargs)
+        metrics.count_retry()
+        return retry
+
+
+class PooledSpotify(spotipy.Spotify):
+    """Spotify client that leaves the shared session open when collected"""
+
+    def __del__(self):
+        pass
+
+
+class PooledClientCredentials(SpotifyClientCredentials):
+    """
+    Client credentials manager that counts token fetches and refreshes its
+    cached token `refresh_margin` seconds ahead of expiry
+    """
+
+    def __init__(self, *args, refresh_margin=300, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_margin = refresh_margin
+        self.token_requests = 0
+        self.token_fetches = 0
+        self.lock = threading.Lock()
+
+    def __del__(self):
+        pass
+
+    def is_token_expired(self, token_info):
+        return token_info['expires_at'] - int(time.time()) < self.refresh_margin
+
+    def get_access_token(self, as_dict=False, check_cache=True):
+        # Serialize so concurrent callers share a single refresh
+        with self.lock:
+            self.token_requests += 1
+            return super().get_access_token(as_dict=as_dict, check_cache=check_cache)
+
+    def _request_access_token(self):
+        self.token_fetches += 1
+        with metrics.timed('spotify_token'):
+            return super()._request_access_token()
+
+
+class PooledOAuth(SpotifyOAuth):
+    """OAuth manager that leaves the shared session open when collected"""
+
+    def __del__(self):
+        pass
+
+
+class SpotifyClientPool:
+    """
+    Shares one keep-alive HTTP session, one client credentials manager and
+    one OAuth manager across requests, and caches per-user clients by their
+    access token.
+    """
+
+    def __init__(self, client_id, client_secret, redirect_uri, scope,
+                 pool_size=20, max_user_clients=256, refresh_margin=300):
+        self.session = requests.Session()
+        # Only connection errors are retried here; 429 and 5xx responses reach
+        # the service's resilience layer with their Retry-After header
+        retry = CountedRetry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=0,
+            backoff_factor=0.3
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.credentials = PooledClientCredentials(
+            client_id=client_id,
+            client_secret=client_secret,
+            cache_handler=MemoryCacheHandler(),
+            requests_session=self.session,
+            refresh_margin=refresh_margin
+        )
+        self.oauth = PooledOAuth(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            scope=scope,
+            cache_handler=MemoryCacheHandler(),
+            requests_session=self.session
+        )
+        self.public_client = PooledSpotify(
+            client_credentials_manager=self.credentials,
+            requests_session=self.session
+        )
+
+        self.max_user_clients = max_user_clients
+        self.user_clients = OrderedDict()
+        self.clients_created = 1
+        self.clients_reused = 0
+        self.lock = threading.Lock()
+
+    def get_public_client(self):
+        """Return the shared client credentials client"""
+        with self.lock:
+            self.clients_reused += 1
+        return self.public_client
+
+    def get_user_client(self, access_token):
+        """Return the cached client for a user access token, creating it if needed"""
+        with self.lock:
+            client = self.user_clients.get(access_token)
+            if client:
+                self.user_clients.move_to_end(access_token)
+                self.clients_reused += 1
+                return client
+
+            client = PooledSpotify(auth=access_token, requests_session=self.session)
+            self.user_clients[access_token] = client
+            self.clients_created += 1
+            while len(self.user_clients) > self.max_user_clients:
+                self.user_clients.popitem(last=False)
+            return client
+
+    def _connection_stats(self):
+        connections = 0
+        requests_sent = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool:
+                    connections += pool.num_connections
+                    requests_sent += pool.num_requests
+        return connections, requests_sent
+
+    def stats(self):
+        """Return reuse counters for diagnostics"""
+        connections, requests_sent = self._connection_stats()
+        return {
+            'clients_created': self.clients_created,
+            'clients_reused': self.clients_reused,
+            'user_clients_cached': len(self.user_clients),
+            'token_requests': self.credentials.token_requests,
+            'token_fetches': self.credentials.token_fetches,
+            'token_fetches_saved': self.credentials.token_requests - self.credentials.token_fetches,
+            'connections_opened': connections,
+            'http_requests': requests_sent,
+            'connections_saved': max(0, requests_sent - connections)
+        }
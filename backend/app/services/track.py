@@ -0,0 +1,67 @@
+import sys
+
+
+def _intern(value):
+    return sys.intern(value) if value else value
+
+
+class Track:
+    """
+    A Spotify track as it flows through a conversion. Slotted, with the artist
+    names held in a tuple of interned strings, so a 10k-track playlist shares
+    one copy of each artist and album name. The search query is derived on
+    access instead of being stored with every track.
+    """
+
+    __slots__ = ('id', 'name', 'artists', 'album', 'duration_ms', 'isrc')
+
+    def __init__(self, id=None, name='', artists=(), album=None, duration_ms=None, isrc=None):
+        self.id = id
+        self.name = name or ''
+        self.artists = tuple(_intern(artist) for artist in artists or ())
+        self.album = _intern(album)
+        self.duration_ms = duration_ms
+        self.isrc = isrc
+
+    @classmethod
+    def from_spotify(cls, track):
+        """Build a Track from a playlist item's 'track' object"""
+        return cls(
+            id=track.get('id'),
+            name=track['name'],
+            artists=[artist['name'] for artist in track['artists']],
+            album=(track.get('album') or {}).get('name'),
+            duration_ms=track.get('duration_ms'),
+            isrc=(track.get('external_ids') or {}).get('isrc')
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a Track stored with to_dict; unknown keys such as an old 'query' are ignored"""
+        return cls(
+            id=data.get('id'),
+            name=data.get('name') or data.get('query'),
+            artists=data.get('artists'),
+            album=data.get('album'),
+            duration_ms=data.get('duration_ms'),
+            isrc=data.get('isrc')
+        )
+
+    def to_dict(self):
+        """JSON-serializable form, as stored in the job store and playlist cache"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'artists': list(self.artists),
+            'album': self.album,
+            'duration_ms': self.duration_ms,
+            'isrc': self.isrc
+        }
+
+    @property
+    def query(self):
+        """Plain search query: the title followed by every artist"""
+        return f"{self.name} {' '.join(self.artists)}".strip()
+
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.query!r})"
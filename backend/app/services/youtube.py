@@ -1,107 +1,191 @@
-from ytmusicapi import YTMusic
-import os
+from app.services.match_cache import MatchCache
+from app.services.rate_limit import is_throttle_error
+from app.services.resilience import Resilience, AdaptiveConcurrency
+from app.services.matcher import TrackFeatures, query_variants, score_candidates
+from app.services.ytmusic_pool import YTMusicClientPool, YTMusicClient, DEFAULT_AUTH_FILE
+from app.services import metrics
 import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 class YouTubeMusicService:
-    def __init__(self):
-        # Initialize progress tracking dictionary
-        self.conversion_progress = {}
+    def __init__(self, app=None):
+        # Spotify track -> videoId cache shared by every conversion
+        self.match_cache = MatchCache.from_config(app.config) if app else MatchCache()
         
-        try:
-            # Try both authentication methods (browser.json or headers_auth.json)
-            # in case the user has set up either one
-            browser_auth_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'browser.json')
-            
-            if not os.path.exists(browser_auth_path):
-                raise Exception("browser.json file not found. Run ytmusicapi browser auth first.")
-            
-            print(f"Initializing YouTube Music with auth file: {browser_auth_path}")
-            
-            # Use the full path to avoid path issues
-            self.ytmusic = YTMusic(browser_auth_path)
-            
-            # Test connection to make sure it's working
-            test = self.ytmusic.get_library_playlists(limit=1)
-            print(f"YouTube Music connection successful. Found {len(test)} test playlists.")
-                
-        except Exception as e:
-            print(f"Error initializing YouTube Music: {str(e)}")
-            raise Exception(f"Failed to initialize YouTube Music: {str(e)}")
+        # Batched playlist insertion settings
+        self.write_chunk_size = app.config['YTM_WRITE_CHUNK_SIZE'] if app else 50
+        self.write_flush_interval = app.config['YTM_WRITE_FLUSH_INTERVAL'] if app else 5.0
+        
+        # One or more YouTube Music accounts, each with its own search rate limit.
+        # Clients are built on first use (or by warm_up), not at startup
+        self.clients = YTMusicClientPool.from_config(app.config) if app else YTMusicClientPool(
+            [YTMusicClient('browser', DEFAULT_AUTH_FILE)]
+        )
+        
+        # Retries and circuit breakers per endpoint, and a limit on searches in
+        # flight per job that halves while YouTube Music throttles
+        self.resilience = Resilience.from_config(app.config) if app else Resilience()
+        self.search_concurrency = AdaptiveConcurrency(app.config['CONVERSION_SEARCH_WORKERS'] if app else 8)
+        
+        # Ranked matching settings
+        self.match_candidates = app.config['MATCH_CANDIDATES'] if app else 5
+        self.match_threshold = app.config['MATCH_CONFIDENCE_THRESHOLD'] if app else 0.6
+        self.match_min_confidence = app.config['MATCH_MIN_CONFIDENCE'] if app else 0.35
+    
+    @property
+    def ytmusic(self):
+        """The primary account's YTMusic client"""
+        return self.clients.primary.ytmusic
+    
+    @property
+    def health(self):
+        return self.clients.health()
+    
+    def warm_up(self):
+        """Connect every account in a background thread so the first request does not pay for it"""
+        def connect():
+            for client in self.clients.clients:
+                try:
+                    client.ytmusic
+                except Exception:
+                    pass
+        
+        thread = threading.Thread(target=connect, name='ytmusic-warmup')
+        thread.daemon = True
+        thread.start()
+        return thread
     
     def create_playlist(self, title, description="Imported from Spotify"):
-        """Create a new playlist on YouTube Music"""
+        """Create a new playlist on the primary YouTube Music account"""
         try:
-            print(f"Creating YouTube Music playlist: '{title}'")
-            playlist_id = self.ytmusic.create_playlist(title, description)
-            print(f"Successfully created playlist with ID: {playlist_id}")
+            client = self.clients.primary
+            ytmusic = client.ytmusic
+            
+            def create():
+                with metrics.timed('ytm_create_playlist'):
+                    return ytmusic.create_playlist(title, description)
+            
+            # Not idempotent: only retried when throttled
+            playlist_id = self.resilience.call('ytm_create_playlist', create, idempotent=False)
+            self.clients.set_owner(playlist_id, client)
+            logger.info("Created YouTube Music playlist",
+                        extra={'title': title, 'playlist_id': playlist_id, 'account': client.name})
             return playlist_id
         except Exception as e:
-            print(f"Failed to create YouTube Music playlist: {str(e)}")
+            logger.error("Failed to create YouTube Music playlist '%s': %s", title, e)
             raise Exception(f"Failed to create playlist: {str(e)}")
     
-    def add_tracks_to_playlist(self, playlist_id, tracks):
+    def add_playlist_items(self, playlist_id, video_ids):
+        """Add a chunk of videoIds to a YouTube Music playlist, as the account that owns it"""
+        ytmusic = self.clients.owner(playlist_id).ytmusic
+        
+        def add():
+            with metrics.timed('ytm_add_items'):
+                return ytmusic.add_playlist_items(playlist_id, video_ids)
+        
+        # A failed add may have been applied, so only throttled adds are retried
+        return self.resilience.call('ytm_add_items', add, idempotent=False)
+    
+    def get_playlist_items(self, playlist_id):
+        """Get the current items of a YouTube Music playlist as videoId/setVideoId dicts"""
+        ytmusic = self.clients.owner(playlist_id).ytmusic
+        playlist = self.resilience.call('ytm_get_playlist', lambda: ytmusic.get_playlist(playlist_id, limit=None))
+        return [
+            {'videoId': item['videoId'], 'setVideoId': item.get('setVideoId')}
+            for item in playlist.get('tracks', [])
+            if item.get('videoId')
+        ]
+    
+    def remove_playlist_items(self, playlist_id, items):
+        """Remove items (dicts with videoId and setVideoId) from a YouTube Music playlist"""
+        ytmusic = self.clients.owner(playlist_id).ytmusic
+        return self.resilience.call(
+            'ytm_remove_items', lambda: ytmusic.remove_playlist_items(playlist_id, items), idempotent=False
+        )
+    
+    def match_track(self, track, report_candidates=0):
         """
-        Add tracks to an existing YouTube Music playlist
-        Expects tracks to be a list of dicts with at least a 'query' key
+        Resolve a Spotify track to (videoId, confidence, candidates), using
+        the match cache before falling back to a search. The top candidates
+        of each query variant are scored locally; a second variant is only
+        searched when the best confidence is below the threshold.
+        candidates lists the report_candidates best scored search results.
+        A cached match is only used when no candidates are wanted, so a
+        report always has them. A miss is remembered in the negative cache.
         """
-        added = 0
-        failed = 0
+        if not report_candidates:
+            cached = self.match_cache.get(track)
+            if cached:
+                return cached[0], cached[1], []
         
-        # Initialize progress tracking
-        progress_id = playlist_id  # Use playlist_id as a key
-        self.conversion_progress[progress_id] = {
-            'total': len(tracks),
-            'processed': 0,
-            'added': 0,
-            'failed': 0,
-            'completed': False,
-            'ytm_playlist_id': playlist_id
-        }
+        features = TrackFeatures(track)
+        video_id, confidence = None, 0.0
+        ranked = []
+        for query in query_variants(track):
+            candidates = self._search(query, self.match_candidates) or []
+            scored = score_candidates(track, candidates[:self.match_candidates], features)
+            ranked.extend(scored)
+            if scored and scored[0][0] > confidence:
+                confidence, video_id = scored[0][0], scored[0][1]['videoId']
+            if confidence >= self.match_threshold:
+                break
         
-        print(f"Adding {len(tracks)} tracks to YouTube Music playlist {playlist_id}")
-        
-        for i, track in enumerate(tracks):
-            query = track.get('query')
-            if not query:
-                failed += 1
-                self.conversion_progress[progress_id]['failed'] = failed
-                self.conversion_progress[progress_id]['processed'] = i + 1
+        if not video_id or confidence < self.match_min_confidence:
+            self.match_cache.set_miss(track, confidence)
+            video_id = None
+        else:
+            self.match_cache.set(track, video_id, confidence)
+        return video_id, confidence, self._report(ranked, report_candidates)
+    
+    @staticmethod
+    def _report(ranked, limit):
+        """The best `limit` distinct scored candidates as plain dicts"""
+        report, seen = [], set()
+        for score, candidate in sorted(ranked, key=lambda item: item[0], reverse=True):
+            if len(report) >= limit:
+                break
+            if candidate['videoId'] in seen:
                 continue
-                
-            try:
-                # Log every 10 tracks to avoid excessive output
-                if i % 10 == 0:
-                    print(f"Processing track {i+1}/{len(tracks)}: {query}")
-                
-                # Search for the track
-                search_results = self.ytmusic.search(query, filter='songs', limit=1)
-                
-                if search_results and len(search_results) > 0:
-                    video_id = search_results[0]['videoId']
-                    self.ytmusic.add_playlist_items(playlist_id, [video_id])
-                    added += 1
-                    self.conversion_progress[progress_id]['added'] = added
-                else:
-                    print(f"No results found for track: {query}")
-                    failed += 1
-                    self.conversion_progress[progress_id]['failed'] = failed
-            except Exception as e:
-                print(f"Failed to add track '{query}': {str(e)}")
-                failed += 1
-                self.conversion_progress[progress_id]['failed'] = failed
-            
-            # Update progress counter
-            self.conversion_progress[progress_id]['processed'] = i + 1
+            seen.add(candidate['videoId'])
+            report.append({
+                'video_id': candidate['videoId'],
+                'title': candidate.get('title'),
+                'artists': [artist.get('name') for artist in candidate.get('artists') or []],
+                'duration_seconds': candidate.get('duration_seconds'),
+                'confidence': score
+            })
+        return report
+    
+    def _search(self, query, limit=1):
+        """
+        Rate-limited search on the least-loaded account. Transient errors are
+        retried with backoff, and a throttled account cools down so the retry
+        goes to another account if one is free.
+        """
+        def attempt():
+            with self.clients.search_client() as client:
+                client.limiter.acquire()
+                try:
+                    ytmusic = client.ytmusic
+                    with metrics.timed('ytm_search'):
+                        results = ytmusic.search(query, filter='songs', limit=limit)
+                    client.succeeded()
+                    return results
+                except Exception as e:
+                    if is_throttle_error(e):
+                        client.throttle()
+                    raise
         
-        # Mark conversion as complete
-        self.conversion_progress[progress_id]['completed'] = True
+        def failover(error):
+            # An account that cannot connect is only skipped if another one can
+            down = [client for client in self.clients.clients if client.is_down]
+            return bool(down) and len(down) < len(self.clients.clients)
         
-        print(f"Finished adding tracks. Added: {added}, Failed: {failed}")
-        return {
-            'added': added,
-            'failed': failed
-        }
+        return self.resilience.call('ytm_search', attempt, concurrency=self.search_concurrency, retry_on=failover)
     
     def get_library_playlists(self):
-        """Get the user's YouTube Music playlists"""
+        """Get the primary account's YouTube Music playlists"""
         return self.ytmusic.get_library_playlists()
\ No newline at end of file
@@ -0,0 +1,208 @@
+import glob
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from app.services.rate_limit import TokenBucket, AdaptiveBackoff
+
+logger = logging.getLogger(__name__)
+
+# Single-account auth file used when no YTM_AUTH_DIR is configured
+DEFAULT_AUTH_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'browser.json')
+
+
+class YTMusicClient:
+    """
+    One YouTube Music account. The YTMusic client is built from its auth file
+    on first use, and the account keeps its own search rate limit, in-flight
+    count and health. A throttled or unreachable account cools down before
+    the pool hands it out again.
+    """
+
+    def __init__(self, name, auth_path, rate=5.0, burst=10, max_cooldown=60.0, ytmusic=None):
+        self.name = name
+        self.auth_path = auth_path
+        self.limiter = TokenBucket(rate, burst)
+        self.backoff = AdaptiveBackoff(self.limiter, max_delay=max_cooldown)
+        self.max_cooldown = max_cooldown
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.searches = 0
+        self.throttled = 0
+        self._ytmusic = ytmusic
+        self._init_lock = threading.Lock()
+        self.health = {'status': 'ok' if ytmusic else 'not_initialized'}
+
+    @property
+    def ytmusic(self):
+        """The account's YTMusic client, connected on first access in a thread-safe way"""
+        if self._ytmusic is None:
+            with self._init_lock:
+                if self._ytmusic is None:
+                    self._ytmusic = self._connect()
+        return self._ytmusic
+
+    @property
+    def is_down(self):
+        return self.health['status'] == 'error'
+
+    def _connect(self):
+        """Build the YTMusic client and check the connection"""
+        self.health = {'status': 'initializing', 'since': time.time()}
+        try:
+            # Deferred so the app starts without importing ytmusicapi
+            from ytmusicapi import YTMusic
+
+            if not os.path.exists(self.auth_path):
+                raise Exception(f"{os.path.basename(self.auth_path)} file not found. Run ytmusicapi browser auth first.")
+
+            logger.info("Initializing YouTube Music", extra={'account': self.name, 'auth_file': self.auth_path})
+
+            # Use the full path to avoid path issues
+            ytmusic = YTMusic(self.auth_path)
+
+            # Test connection to make sure it's working
+            test = ytmusic.get_library_playlists(limit=1)
+            logger.info("YouTube Music connection successful", extra={'account': self.name, 'test_playlists': len(test)})
+
+            self.health = {'status': 'ok', 'connected_at': time.time()}
+            return ytmusic
+        except Exception as e:
+            logger.error("Error initializing YouTube Music account %s: %s", self.name, e)
+            self.health = {'status': 'error', 'message': str(e), 'failed_at': time.time()}
+            # Leave the account out of rotation for a while before reconnecting
+            self.cooldown_until = time.monotonic() + self.max_cooldown
+            raise Exception(f"Failed to initialize YouTube Music: {str(e)}")
+
+    def succeeded(self):
+        """Record a successful call"""
+        self.backoff.success()
+
+    def throttle(self):
+        """Record a throttling error and cool down for the current backoff delay"""
+        self.throttled += 1
+        self.backoff.failure()
+        self.cooldown_until = time.monotonic() + self.backoff.delay * random.uniform(0.5, 1.0)
+
+    def stats(self):
+        cooldown = self.cooldown_until - time.monotonic()
+        return dict(
+            self.backoff.stats(),
+            name=self.name,
+            status=self.health['status'],
+            cooling_down=round(cooldown, 3) if cooldown > 0 else 0,
+            in_flight=self.in_flight,
+            searches=self.searches
+        )
+
+
+class YTMusicClientPool:
+    """
+    Schedules work across one or more YouTube Music accounts. Searches go to
+    the least-loaded account that is not cooling down, relative to its
+    current search rate. Writes go to the account that owns the playlist:
+    new playlists are created on the primary (first) account, and the owner
+    of any other playlist is looked up in each account's library once.
+    """
+
+    def __init__(self, clients):
+        if not clients:
+            raise ValueError('At least one YouTube Music account is required')
+        self.clients = list(clients)
+        self.primary = self.clients[0]
+        self.owners = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a pool from the YTM_* app settings: one account per *.json auth
+        file in YTM_AUTH_DIR, sorted by name, or the single YTM_AUTH_FILE
+        """
+        auth_dir = config['YTM_AUTH_DIR']
+        paths = sorted(glob.glob(os.path.join(auth_dir, '*.json'))) if auth_dir else []
+        if not paths:
+            paths = [config['YTM_AUTH_FILE']]
+        return cls([
+            YTMusicClient(
+                os.path.splitext(os.path.basename(path))[0],
+                path,
+                rate=config['YTM_SEARCH_RATE'],
+                burst=config['YTM_SEARCH_BURST'],
+                max_cooldown=config['YTM_CLIENT_COOLDOWN']
+            )
+            for path in paths
+        ])
+
+    @contextmanager
+    def search_client(self):
+        """Hand out the account for one search, counting it as in flight"""
+        client = self._pick()
+        try:
+            yield client
+        finally:
+            with self.lock:
+                client.in_flight -= 1
+
+    def _pick(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                ready = [client for client in self.clients if client.cooldown_until <= now]
+                if ready:
+                    client = min(ready, key=lambda c: (c.in_flight / c.limiter.rate, c.searches))
+                    client.in_flight += 1
+                    client.searches += 1
+                    return client
+                if all(client.is_down for client in self.clients):
+                    # Waiting out the cooldown would only lead to another failed connect
+                    raise Exception('No YouTube Music account is available: every account failed to connect')
+                wait = min(client.cooldown_until for client in self.clients if not client.is_down) - now
+            # Every working account is throttled, wait for the first to come back
+            time.sleep(wait)
+
+    def set_owner(self, playlist_id, client):
+        with self.lock:
+            self.owners[playlist_id] = client
+
+    def owner(self, playlist_id):
+        """Return the account that owns a playlist, defaulting to the primary one"""
+        with self.lock:
+            client = self.owners.get(playlist_id)
+        if client:
+            return client
+
+        client = self.primary
+        if len(self.clients) > 1:
+            for candidate in self.clients:
+                try:
+                    playlists = candidate.ytmusic.get_library_playlists(limit=None)
+                except Exception as e:
+                    logger.warning("Could not list playlists of account %s: %s", candidate.name, e)
+                    continue
+                if any(playlist.get('playlistId') == playlist_id for playlist in playlists):
+                    client = candidate
+                    break
+        self.set_owner(playlist_id, client)
+        return client
+
+    def health(self):
+        """Overall status plus each account's health"""
+        statuses = [client.health['status'] for client in self.clients]
+        if 'ok' in statuses:
+            status = 'ok'
+        elif all(s == 'error' for s in statuses):
+            status = 'error'
+        else:
+            status = statuses[0]
+        return {'status': status, 'accounts': {client.name: client.health for client in self.clients}}
+
+    def stats(self):
+        return {
+            'accounts': [client.stats() for client in self.clients],
+            'primary': self.primary.name,
+            'owned_playlists': len(self.owners)
+        }
@@ -0,0 +1,193 @@
+"""
+Offline conversion benchmark. Runs synthetic conversions end to end through
+the Flask routes (POST /convert, then the /convert-progress stream) against
+local stand-ins for Spotify and YouTube Music, and reports tracks/sec, p50 and
+p99 per-track latency, peak RSS, API call counts and the job's per-stage
+latency summary.
+
+Each size runs in its own interpreter so peak RSS is not shared between runs.
+
+Usage (from the backend directory):
+    python -m benchmarks.conversion [--sizes 100 1000 10000] [--output results.json]
+        [--search-latency 0.02] [--page-latency 0.05]
+        [--error-rate 0.0] [--throttle-rate 0.0] [--concurrency 8] [--accounts 1]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_worker(args):
+    """Run one conversion in this process and print its results as JSON"""
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app
+    from app import routes
+    from app.services.ytmusic_pool import YTMusicClient, YTMusicClientPool
+    from benchmarks.fakes import FakeClientPool, FakeSpotify, FakeYTMusic, TrackClock
+
+    clock = TrackClock()
+    spotify = FakeSpotify(clock, latency=args.page_latency, error_rate=args.error_rate, seed=1)
+    accounts = [
+        FakeYTMusic(clock, latency=args.search_latency, error_rate=args.error_rate,
+                    throttle_rate=args.throttle_rate, seed=2 + index)
+        for index in range(args.accounts)
+    ]
+
+    app = create_app()
+    routes.spotify_service._clients = FakeClientPool(spotify)
+    routes.ytmusic_service.clients = YTMusicClientPool([
+        YTMusicClient(f'bench{index}', None, rate=app.config['YTM_SEARCH_RATE'],
+                      burst=app.config['YTM_SEARCH_BURST'], ytmusic=ytmusic)
+        for index, ytmusic in enumerate(accounts)
+    ])
+    client = app.test_client()
+
+    start = time.perf_counter()
+    response = client.post('/convert', json={
+        'playlist_id': f'bench-{args.size}',
+        'playlist_name': f'Benchmark {args.size}',
+        'use_auth': False,
+        'concurrency': args.concurrency
+    })
+    body = response.get_json()
+    if response.status_code != 200:
+        raise SystemExit(f"/convert failed: {body}")
+    convert_returned = time.perf_counter() - start
+
+    # Follow the progress stream until the job reports completion
+    final = {}
+    stream = client.get(f"/convert-progress/{body['youtube_playlist_id']}", buffered=False)
+    for chunk in stream.response:
+        for line in chunk.decode().splitlines():
+            if line.startswith('data: '):
+                final = json.loads(line[len('data: '):])
+        if final.get('completed'):
+            break
+    stream.close()
+    elapsed = time.perf_counter() - start
+    job = client.get(f"/jobs/{body['job_id']}").get_json()
+
+    latencies = clock.latencies()
+    search_latencies = [latency for ytmusic in accounts for latency in ytmusic.search_latencies]
+    result = {
+        'size': args.size,
+        'concurrency': args.concurrency,
+        'accounts': args.accounts,
+        'elapsed_s': round(elapsed, 3),
+        'convert_response_s': round(convert_returned, 4),
+        'tracks_per_s': round(args.size / elapsed, 2) if elapsed else None,
+        'track_latency_ms': {
+            'p50': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None
+        },
+        'search_latency_ms': {
+            'p50': round(percentile(search_latencies, 0.5) * 1000, 2) if search_latencies else None,
+            'p99': round(percentile(search_latencies, 0.99) * 1000, 2) if search_latencies else None,
+            'mean': round(statistics.mean(search_latencies) * 1000, 2) if search_latencies else None
+        },
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'progress': final,
+        'stages': job.get('metrics'),
+        'api_calls': {
+            'spotify': dict(spotify.calls),
+            'ytmusic': dict(sum((ytmusic.calls for ytmusic in accounts), Counter()))
+        },
+        'api_errors': {
+            'spotify': dict(spotify.errors),
+            'ytmusic': dict(sum((ytmusic.errors for ytmusic in accounts), Counter()))
+        }
+    }
+    print(json.dumps(result))
+
+
+def run_size(args, size, tmp):
+    """Run one size in a fresh interpreter with its own databases"""
+    env = dict(os.environ)
+    env.update({
+        'MATCH_CACHE_PATH': os.path.join(tmp, f'match_cache-{size}.db'),
+        'JOB_STORE_PATH': os.path.join(tmp, f'jobs-{size}.db'),
+        'YTM_SEARCH_RATE': str(args.search_rate),
+        'YTM_SEARCH_BURST': str(int(args.search_rate)),
+        'CONVERSION_SEARCH_WORKERS': str(max(args.concurrency, 1)),
+        'PROGRESS_HEARTBEAT': '1'
+    })
+    command = [
+        sys.executable, '-m', 'benchmarks.conversion', '--worker',
+        '--size', str(size),
+        '--concurrency', str(args.concurrency),
+        '--search-latency', str(args.search_latency),
+        '--page-latency', str(args.page_latency),
+        '--error-rate', str(args.error_rate),
+        '--throttle-rate', str(args.throttle_rate),
+        '--accounts', str(args.accounts)
+    ]
+    output = subprocess.check_output(command, cwd=BACKEND_DIR, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--search-latency', type=float, default=0.02, help='seconds per fake search')
+    parser.add_argument('--page-latency', type=float, default=0.05, help='seconds per fake Spotify page')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls that fail with a 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of searches that fail with a 429')
+    parser.add_argument('--search-rate', type=float, default=10000, help='YTM_SEARCH_RATE (per account) for the run')
+    parser.add_argument('--accounts', type=int, default=1, help='number of fake YouTube Music accounts')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            result = run_size(args, size, tmp)
+            print(f"{size:>6} tracks: {result['tracks_per_s']:>8} tracks/s, "
+                  f"p50 {result['track_latency_ms']['p50']} ms, p99 {result['track_latency_ms']['p99']} ms, "
+                  f"peak RSS {result['peak_rss_mb']} MB, calls {result['api_calls']}", file=sys.stderr)
+            results.append(result)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'settings': {
+            'concurrency': args.concurrency,
+            'search_latency': args.search_latency,
+            'page_latency': args.page_latency,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+            'search_rate': args.search_rate,
+            'accounts': args.accounts
+        },
+        'results': results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Local stand-ins for spotipy.Spotify and ytmusicapi.YTMusic used by the
+offline benchmarks. Both simulate latency and error rates, count API calls,
+and share a clock so per-track latency can be measured end to end.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeBackend:
+    """Latency, error injection and call accounting shared by the fakes"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = Counter()
+        self.lock = threading.Lock()
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+            roll = self.random.random()
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            with self.lock:
+                self.errors[name] += 1
+            raise FakeError('Server returned HTTP 429: Too Many Requests')
+        if roll < self.throttle_rate + self.error_rate:
+            with self.lock:
+                self.errors[name] += 1
+            raise FakeError('Server returned HTTP 500: Internal Server Error')
+
+
+class TrackClock:
+    """Records when each synthetic track was served and when it was added"""
+
+    def __init__(self):
+        self.served = {}
+        self.added = {}
+        self.lock = threading.Lock()
+
+    def mark_served(self, index):
+        with self.lock:
+            self.served.setdefault(index, time.perf_counter())
+
+    def mark_added(self, index):
+        with self.lock:
+            self.added.setdefault(index, time.perf_counter())
+
+    def latencies(self):
+        with self.lock:
+            return [self.added[i] - self.served[i] for i in self.added if i in self.served]
+
+
+def synthetic_track(index):
+    return {
+        'id': f'sp{index:08d}',
+        'name': f'Track {index}',
+        'duration_ms': 180000 + (index % 60) * 1000,
+        'external_ids': {'isrc': f'XX{index:010d}'},
+        'album': {'name': f'Album {index // 12}'},
+        'artists': [{'name': f'Artist {index % 500}'}]
+    }
+
+
+class FakeSpotify(FakeBackend):
+    """
+    Minimal spotipy.Spotify stand-in. Playlist IDs of the form 'bench-<n>'
+    contain n synthetic tracks.
+    """
+
+    def __init__(self, clock=None, **kwargs):
+        super().__init__(**kwargs)
+        self.clock = clock or TrackClock()
+
+    @staticmethod
+    def _size(playlist_id):
+        match = re.match(r'bench-(\d+)', playlist_id)
+        if not match:
+            raise FakeError(f'HTTP 404: playlist {playlist_id} not found')
+        return int(match.group(1))
+
+    def playlist(self, playlist_id, fields=None, market=None, **kwargs):
+        self._call('playlist')
+        size = self._size(playlist_id)
+        return {
+            'id': playlist_id,
+            'name': f'Benchmark {size}',
+            'snapshot_id': f'snap-{size}',
+            'public': True,
+            'owner': {'id': 'bench'},
+            'images': [],
+            'tracks': {'total': size}
+        }
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, market=None, **kwargs):
+        self._call('playlist_items')
+        size = self._size(playlist_id)
+        indexes = range(offset, min(size, offset + limit))
+        for index in indexes:
+            self.clock.mark_served(index)
+        return {
+            'total': size,
+            'items': [{'track': synthetic_track(index)} for index in indexes]
+        }
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self._call('current_user_playlists')
+        return {'total': 0, 'items': []}
+
+    def categories(self, country=None, limit=20):
+        self._call('categories')
+        return {'categories': {'items': [{'id': 'bench'}]}}
+
+
+class FakeYTMusic(FakeBackend):
+    """Minimal ytmusicapi.YTMusic stand-in that resolves synthetic tracks"""
+
+    def __init__(self, clock=None, **kwargs):
+        super().__init__(**kwargs)
+        self.clock = clock or TrackClock()
+        self.playlists = {}
+        self.search_latencies = []
+
+    def search(self, query, filter=None, limit=20, **kwargs):
+        start = time.perf_counter()
+        self._call('search')
+        match = re.search(r'Track (\d+)', query)
+        results = []
+        if match:
+            index = int(match.group(1))
+            track = synthetic_track(index)
+            results.append({
+                'videoId': f'yt{index:09d}',
+                'title': track['name'],
+                'artists': [{'name': artist['name']} for artist in track['artists']],
+                'album': {'name': track['album']['name']},
+                'duration_seconds': track['duration_ms'] // 1000
+            })
+            # A live version as a distractor for the matcher
+            results.append({
+                'videoId': f'lv{index:09d}',
+                'title': f"{track['name']} (Live)",
+                'artists': [{'name': artist['name']} for artist in track['artists']],
+                'duration_seconds': track['duration_ms'] // 1000 + 40
+            })
+        with self.lock:
+            self.search_latencies.append(time.perf_counter() - start)
+        return results[:limit]
+
+    def create_playlist(self, title, description, **kwargs):
+        self._call('create_playlist')
+        playlist_id = f'PLbench{len(self.playlists)}'
+        self.playlists[playlist_id] = []
+        return playlist_id
+
+    def add_playlist_items(self, playlist_id, video_ids, **kwargs):
+        self._call('add_playlist_items')
+        self.playlists.setdefault(playlist_id, []).extend(video_ids)
+        for video_id in video_ids:
+            self.clock.mark_added(int(video_id[2:]))
+        return {'status': 'STATUS_SUCCEEDED'}
+
+    def get_playlist(self, playlist_id, limit=100, **kwargs):
+        self._call('get_playlist')
+        return {'tracks': [{'videoId': v, 'setVideoId': f'set-{v}'} for v in self.playlists.get(playlist_id, [])]}
+
+    def remove_playlist_items(self, playlist_id, videos):
+        self._call('remove_playlist_items')
+        removed = {video['videoId'] for video in videos}
+        self.playlists[playlist_id] = [v for v in self.playlists.get(playlist_id, []) if v not in removed]
+        return 'STATUS_SUCCEEDED'
+
+    def get_library_playlists(self, limit=25):
+        self._call('get_library_playlists')
+        return [{'playlistId': playlist_id} for playlist_id in self.playlists][:limit]
+
+
+class FakeClientPool:
+    """Stands in for SpotifyClientPool, handing out one FakeSpotify"""
+
+    def __init__(self, spotify):
+        self.spotify = spotify
+
+    def get_public_client(self):
+        return self.spotify
+
+    def get_user_client(self, access_token):
+        return self.spotify
+
+    def stats(self):
+        return {'fake': True}
@@ -0,0 +1,185 @@
+"""
+Concurrent connection load test. Starts the backend under the threaded Flask
+server and under the ASGI server (app/asgi.py, needs uvicorn), holds N open
+/convert-progress streams against each, and measures whether every stream was
+accepted, the latency of ordinary requests made meanwhile, and the server's
+thread count and RSS.
+
+Usage (from the backend directory):
+    python -m benchmarks.sse_load [--connections 50 200 1000] [--servers flask asgi]
+        [--probes 20] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+
+def serve(args):
+    """Run one server in this process until it is killed"""
+    sys.path.insert(0, BACKEND_DIR)
+    from app import create_app
+
+    app = create_app()
+    if args.serve == 'asgi':
+        import uvicorn
+        from app.asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(app), host=HOST, port=args.port, log_level='warning', backlog=4096)
+    else:
+        from werkzeug.serving import run_simple
+        run_simple(HOST, args.port, app, threaded=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def process_stats(pid):
+    """Thread count and resident memory of a process, from /proc"""
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    stats['threads'] = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    stats['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return stats
+
+
+async def open_stream(port, index, timeout):
+    """Open a progress stream and wait for its response headers"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+        writer.write(f'GET /convert-progress/load-test-{index} HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode())
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+        if b' 200 ' not in head.split(b'\r\n', 1)[0]:
+            writer.close()
+            return None
+        return writer
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+
+
+async def probe(port, timeout):
+    """Time one ordinary request on a new connection"""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+        writer.write(f'GET /cors-test HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        return time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def run_level(port, pid, connections, probes, timeout):
+    start = time.perf_counter()
+    writers = await asyncio.gather(*(open_stream(port, index, timeout) for index in range(connections)))
+    open_s = time.perf_counter() - start
+    accepted = [writer for writer in writers if writer]
+
+    latencies = []
+    for _ in range(probes):
+        latencies.append(await probe(port, timeout))
+    answered = sorted(latency for latency in latencies if latency is not None)
+    stats = process_stats(pid)
+
+    for writer in accepted:
+        writer.close()
+
+    return dict(
+        connections=connections,
+        accepted=len(accepted),
+        open_s=round(open_s, 3),
+        probes_answered=len(answered),
+        probe_ms={
+            'p50': round(statistics.median(answered) * 1000, 2) if answered else None,
+            'max': round(answered[-1] * 1000, 2) if answered else None
+        },
+        **stats
+    )
+
+
+def run_server(server, args, tmp):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'MATCH_CACHE_PATH': os.path.join(tmp, f'match_cache-{server}.db'),
+        'JOB_STORE_PATH': os.path.join(tmp, f'jobs-{server}.db'),
+        'PROGRESS_HEARTBEAT': '5',
+        'LOG_LEVEL': 'WARNING'
+    })
+    command = [sys.executable, '-m', 'benchmarks.sse_load', '--serve', server, '--port', str(port)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL)
+    try:
+        # Wait for the server to listen
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection((HOST, port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        idle = process_stats(process.pid)
+
+        results = []
+        for connections in args.connections:
+            result = asyncio.run(run_level(port, process.pid, connections, args.probes, args.timeout))
+            print(f"{server:>5} {connections:>5} streams: {result['accepted']} accepted, "
+                  f"probe p50 {result['probe_ms']['p50']} ms, threads {result.get('threads')}, "
+                  f"RSS {result.get('rss_mb')} MB", file=sys.stderr)
+            results.append(result)
+            # Let the server notice the closed streams before the next level
+            time.sleep(2)
+        return {'server': server, 'idle': idle, 'levels': results}
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--servers', nargs='+', choices=['flask', 'asgi'], default=['flask', 'asgi'])
+    parser.add_argument('--probes', type=int, default=20, help='ordinary requests timed at each level')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for each connection')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--serve', choices=['flask', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'results': [run_server(server, args, tmp) for server in args.servers]
+        }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
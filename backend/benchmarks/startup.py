@@ -0,0 +1,71 @@
+"""
+Startup benchmark: measures how long `create_app()` takes in a fresh
+interpreter and which heavy client libraries it pulls in.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup [--runs 10] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a child process so every measurement starts with a cold import cache
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'total_ms': (created - start) * 1000,
+    'loaded': {name: name in sys.modules for name in ('ytmusicapi', 'spotipy', 'requests')}
+}))
+"""
+
+
+def run_once(env):
+    output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'MATCH_CACHE_PATH': os.path.join(tmp, 'match_cache.db'),
+            'JOB_STORE_PATH': os.path.join(tmp, 'jobs.db'),
+            'YTM_WARMUP': 'false'
+        })
+        samples = [run_once(env) for _ in range(args.runs)]
+
+    result = {'runs': args.runs, 'loaded': samples[-1]['loaded']}
+    for field in ('import_ms', 'create_app_ms', 'total_ms'):
+        values = [sample[field] for sample in samples]
+        result[field] = {
+            'median': round(statistics.median(values), 2),
+            'min': round(min(values), 2),
+            'max': round(max(values), 2)
+        }
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Track memory benchmark: builds the track list of an N-track playlist from
+synthetic Spotify pages, once as the per-track dicts the converter used to
+keep (with a preformatted 'query') and once as Track records, and reports the
+memory each list retains per track.
+
+Usage (from the backend directory):
+    python -m benchmarks.track_memory [--sizes 1000 10000 100000] [--json results.json]
+"""
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+from app.services.track import Track
+from benchmarks.fakes import synthetic_track
+
+PAGE_SIZE = 100
+
+
+def legacy_track(track):
+    """The dict built for every track before Track existed"""
+    artist_names = [artist['name'] for artist in track['artists']]
+    return {
+        'id': track.get('id'),
+        'name': track['name'],
+        'artists': artist_names,
+        'album': (track.get('album') or {}).get('name'),
+        'duration_ms': track.get('duration_ms'),
+        'isrc': (track.get('external_ids') or {}).get('isrc'),
+        'query': f"{track['name']} {' '.join(artist_names)}"
+    }
+
+
+def pages(size):
+    """Decoded Spotify pages, so every string is a distinct object as it is off the wire"""
+    for offset in range(0, size, PAGE_SIZE):
+        page = [{'track': synthetic_track(index)} for index in range(offset, min(size, offset + PAGE_SIZE))]
+        yield json.loads(json.dumps(page))
+
+
+def retained(size, build):
+    """Bytes still allocated once the pages are gone and only the track list is left"""
+    gc.collect()
+    tracemalloc.start()
+    tracks = []
+    for page in pages(size):
+        tracks.extend(build(item['track']) for item in page)
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tracks
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        before = retained(size, legacy_track)
+        after = retained(size, Track.from_spotify)
+        results.append({
+            'tracks': size,
+            'dict_bytes_per_track': round(before / size),
+            'track_bytes_per_track': round(after / size),
+            'saved': round(1 - after / before, 3)
+        })
+        print(f"{size:>7} tracks: dict {before / size:.0f} B/track, Track {after / size:.0f} B/track",
+              file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
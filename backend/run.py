@@ -1,6 +1,19 @@
+import os
+import sys
 from app import create_app
 
-app = create_app()
+# Under the debug reloader this process only watches files and restarts the
+# child that serves requests (WERKZEUG_RUN_MAIN is set there), so only the
+# child resumes interrupted jobs
+reloader_parent = (__name__ == '__main__' and '--async' not in sys.argv
+                   and os.environ.get('WERKZEUG_RUN_MAIN') != 'true')
+app = create_app(resume_jobs=not reloader_parent)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    if '--async' in sys.argv:
+        # ASGI server: progress streams on the event loop, other requests on a bounded pool
+        import uvicorn
+        from app.asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(app), port=5000)
+    else:
+        app.run(debug=True)
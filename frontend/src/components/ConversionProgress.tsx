@@ -7,6 +7,7 @@ interface ConversionProgressProps {
     processed: number;
     added: number;
     failed: number;
+    unmatched_cached?: number;
     completed?: boolean;
   };
 }
@@ -53,6 +54,11 @@ const ConversionProgress: React.FC<ConversionProgressProps> = ({ progress }) =>
           >
             Failed: {progress.failed}
           </Chip>
+          {!!progress.unmatched_cached && (
+            <Chip color="warning" variant="flat">
+              Unmatched (cached): {progress.unmatched_cached}
+            </Chip>
+          )}
         </div>
       </CardBody>
     </Card>
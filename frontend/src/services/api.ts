@@ -43,8 +43,13 @@ export const spotifyApi = {
   getPlaylists: () => api.get('/playlists'),
   getPublicPlaylist: (playlistId: string) => api.get(`/public-playlist/${playlistId}`),
   getPlaylistTracks: (playlistId: string) => api.get(`/playlist-tracks/${playlistId}`),
-  convertPlaylist: (playlistId: string, playlistName: string, description: string) => 
-    api.post('/convert', { playlist_id: playlistId, playlist_name: playlistName, description }),
+  convertPlaylist: (playlistId: string, playlistName: string, description: string, concurrency?: number) => 
+    api.post('/convert', { playlist_id: playlistId, playlist_name: playlistName, description, concurrency }),
+  convertBatch: (playlistIds: string[] | 'all', concurrency?: number) =>
+    api.post('/convert-batch', { playlist_ids: playlistIds, concurrency }),
+  getBatchProgress: (batchId: string) => api.get(`/convert-batch/${batchId}`),
+  syncPlaylist: (playlistId: string, youtubePlaylistId: string, removeMissing: boolean = false) =>
+    api.post('/sync', { playlist_id: playlistId, youtube_playlist_id: youtubePlaylistId, remove_missing: removeMissing }),
   diagnose: () => api.get('/diagnose'),
   testPlaylists: () => api.get('/test-playlists'),
   getConversionProgress: (playlistId: string) => api.get(`/convert-progress/${playlistId}`)